@@ -0,0 +1,210 @@
+"""
+Priority-aware admission control.
+
+Work is split into classes by how much a user is waiting on it: interactive
+(chat) over standard (summary, quiz, transcript, complete analysis) over
+background (preload jobs, batch items, quiz bank top-ups). Every class has
+its own concurrency cap under one shared limit, and the lower classes' caps
+leave headroom, so a burst of background work can't take the slots chat
+needs. When a slot frees up, waiters of the highest-priority class get it
+first.
+
+HTTP requests fail fast instead of queueing without bound: over the per-key
+limit, past a class's queue size, or after waiting max_wait, admit() raises
+Overloaded with a Retry-After estimate for a 429 response.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import NamedTuple, Optional
+
+INTERACTIVE = "interactive"
+STANDARD = "standard"
+BACKGROUND = "background"
+
+
+class ClassLimits(NamedTuple):
+    """Admission settings for one priority class (lower priority number = served first)."""
+    priority: int
+    limit: int
+    max_queue: int
+    max_wait: Optional[float] = None
+
+
+class Overloaded(Exception):
+    """A request was not admitted; retry after retry_after seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Class:
+    def __init__(self, name, limits):
+        self.name = name
+        self.limits = limits
+        self.active = 0
+        self.waiting = deque()
+        self.admitted = 0
+        self.rejected = 0
+        # Moving average of how long a slot is held, for Retry-After estimates
+        self.hold_seconds = 1.0
+
+
+class AdmissionController:
+    """
+    Args:
+        max_concurrency (int): Slots held at once across all classes
+        classes (dict): Class name -> ClassLimits
+        per_key_limit (int): Admitted plus waiting requests one key may have (None = no limit)
+    """
+
+    def __init__(self, max_concurrency, classes, per_key_limit=None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_key_limit = per_key_limit
+        self._classes = {name: _Class(name, limits) for name, limits in classes.items()}
+        self._by_priority = sorted(self._classes.values(), key=lambda c: c.limits.priority)
+        self._active = 0
+        self._per_key = {}
+
+    def _has_room(self, cls):
+        return self._active < self.max_concurrency and cls.active < cls.limits.limit
+
+    def _take(self, cls):
+        self._active += 1
+        cls.active += 1
+        cls.admitted += 1
+
+    def _grant(self):
+        """Give free slots to waiters, highest-priority class first."""
+        for cls in self._by_priority:
+            while cls.waiting and self._has_room(cls):
+                future = cls.waiting.popleft()
+                if future.done():
+                    continue  # gave up waiting
+                self._take(cls)
+                future.set_result(None)
+            if self._active >= self.max_concurrency:
+                return
+
+    def retry_after(self, name):
+        """Seconds until a new request of class name is likely to be admitted (1-60)."""
+        cls = self._classes[name]
+        backlog = len(cls.waiting) + 1
+        estimate = cls.hold_seconds * backlog / max(1, cls.limits.limit)
+        return max(1, min(60, math.ceil(estimate)))
+
+    def _reject(self, cls, message):
+        cls.rejected += 1
+        raise Overloaded(message, self.retry_after(cls.name))
+
+    def check(self, name):
+        """
+        Raise Overloaded if class name's queue is already full, without
+        admitting anything (for endpoints that queue work of their own).
+        """
+        cls = self._classes[name]
+        if not self._has_room(cls) and len(cls.waiting) >= cls.limits.max_queue:
+            self._reject(cls, f"Too many {name} requests waiting")
+
+    def _add_key(self, key, cls):
+        if key is None or self.per_key_limit is None:
+            return
+        held = self._per_key.get(key, 0)
+        if held >= self.per_key_limit:
+            self._reject(cls, "Too many concurrent requests for this API key")
+        self._per_key[key] = held + 1
+
+    def _remove_key(self, key):
+        if key is None or self.per_key_limit is None:
+            return
+        held = self._per_key[key] - 1
+        if held:
+            self._per_key[key] = held
+        else:
+            del self._per_key[key]
+
+    async def _wait(self, cls, wait):
+        if self._has_room(cls) and not cls.waiting:
+            self._take(cls)
+            return
+        if not wait:
+            self._reject(cls, f"No {cls.name} capacity available")
+        if len(cls.waiting) >= cls.limits.max_queue:
+            self._reject(cls, f"Too many {cls.name} requests waiting")
+
+        future = asyncio.get_running_loop().create_future()
+        cls.waiting.append(future)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=cls.limits.max_wait)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return  # granted just as the wait ran out
+            self._abandon(cls, future)
+            self._reject(cls, f"Timed out waiting for {cls.name} capacity")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(cls)
+            else:
+                self._abandon(cls, future)
+            raise
+
+    @staticmethod
+    def _abandon(cls, future):
+        future.cancel()
+        try:
+            cls.waiting.remove(future)
+        except ValueError:
+            pass
+
+    def _release(self, cls):
+        self._active -= 1
+        cls.active -= 1
+        self._grant()
+
+    @asynccontextmanager
+    async def admit(self, name, key=None, wait=True):
+        """
+        Hold one slot of class name while the block runs.
+
+        Args:
+            name (str): Priority class
+            key (str): Caller identity for the per-key limit (None = not limited)
+            wait (bool): Queue for a slot (bounded by the class's max_queue and
+                max_wait) instead of failing at once
+
+        Raises:
+            Overloaded: If the request can't be admitted
+        """
+        cls = self._classes[name]
+        self._add_key(key, cls)
+        try:
+            await self._wait(cls, wait)
+        except BaseException:
+            self._remove_key(key)
+            raise
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            cls.hold_seconds = 0.8 * cls.hold_seconds + 0.2 * (time.monotonic() - started)
+            self._remove_key(key)
+            self._release(cls)
+
+    def stats(self):
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "classes": {
+                name: {
+                    "active": cls.active,
+                    "limit": cls.limits.limit,
+                    "waiting": len(cls.waiting),
+                    "admitted": cls.admitted,
+                    "rejected": cls.rejected,
+                }
+                for name, cls in self._classes.items()
+            },
+        }
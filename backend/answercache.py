@@ -0,0 +1,165 @@
+"""
+Semantic cache of chat answers, per video.
+
+Students ask the same things about the same lecture in different words
+("what are the main points?", "main points of this video"). Questions asked
+without chat history are embedded locally as hashed n-gram vectors (word
+unigrams and bigrams plus character trigrams, sublinear TF, L2-normalized)
+and compared by cosine similarity, a single NumPy matrix-vector product per
+lookup. A question close enough to an earlier one gets that answer back
+without a model call.
+
+The lossy n-gram features drop symbols and stopwords, so "What is C?" and
+"What is C++?" (or "2+2" and "2-2") embed alike, and so do "Why did the Roman
+Empire fall?" and "When did the Roman Empire fall?". Terms containing
+symbols and the interrogatives that decide what kind of answer is wanted
+(why, how, when, where, who, ...) are therefore compared exactly: a similar
+question only matches if they are the same.
+"""
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from retrieval import tokenize
+
+_EDGE_PUNCTUATION = " \t\n?!.,;:\"'()"
+_WORD_HYPHEN_RE = re.compile(r"(?<=[a-z])-(?=[a-z])")
+_SYMBOL_RE = re.compile(r"[^\w']")
+_WORD_RE = re.compile(r"[a-z]+")
+# "what" and "which" are left out: they rarely change the answer ("what are
+# the main points" vs "main points of this video")
+_QUESTION_WORDS = frozenset({"why", "how", "when", "where", "who", "whom", "whose"})
+
+
+def normalize_question(question):
+    """
+    Lowercased question with whitespace collapsed and surrounding punctuation
+    removed, for exact matching of trivially different questions. Symbols
+    inside the question (C++, C#, 2+2, .NET) are kept.
+    """
+    return " ".join(question.lower().split()).strip(_EDGE_PUNCTUATION)
+
+
+def symbol_terms(question):
+    """Terms of question that contain symbols (other than hyphens inside words)."""
+    terms = set()
+    for term in question.lower().split():
+        term = term.strip(_EDGE_PUNCTUATION)
+        if _SYMBOL_RE.search(_WORD_HYPHEN_RE.sub("", term)):
+            terms.add(term)
+    return frozenset(terms)
+
+
+def question_words(question):
+    """Interrogatives in question that change what kind of answer it asks for."""
+    return frozenset(w for w in _WORD_RE.findall(question.lower()) if w in _QUESTION_WORDS)
+
+
+def _signature(question):
+    return symbol_terms(question), question_words(question)
+
+
+def _features(question):
+    words = tokenize(question)
+    features = list(words)
+    features += [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f" {word} "
+        features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    return features
+
+
+def embed(question, dim=2048):
+    """
+    Hashed n-gram vector of question (float32, unit length, or all zeros if
+    the question has no content words).
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    features = _features(question)
+    if not features:
+        return vector
+    # crc32 rather than hash(): stable across processes and restarts
+    buckets = np.fromiter((zlib.crc32(f.encode("utf-8")) % dim for f in features), dtype=np.int64, count=len(features))
+    counts = np.bincount(buckets, minlength=dim).astype(np.float32)
+    np.log1p(counts, out=counts)
+    norm = np.linalg.norm(counts)
+    return counts / norm if norm else counts
+
+
+class VideoAnswers:
+    """
+    Cached answers for one video, matched by question similarity.
+
+    Args:
+        threshold (float): Cosine similarity a question needs to reuse an answer
+        max_entries (int): Answers kept; the oldest is replaced beyond that
+        dim (int): Embedding size
+
+    The vector matrix grows with the number of answers (up to max_entries
+    rows of dim float32s), so rarely discussed videos stay small.
+    """
+
+    def __init__(self, threshold=0.9, max_entries=64, dim=2048):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.dim = dim
+        self._vectors = np.zeros((min(8, max_entries), dim), dtype=np.float32)
+        self._questions = [None] * max_entries
+        self._answers = [None] * max_entries
+        self._signatures = [None] * max_entries
+        self._exact = {}
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        return self._vectors.nbytes + sum(len(a) for a in self._answers if a is not None)
+
+    def lookup(self, question):
+        """
+        Returns:
+            tuple: (answer, similarity, matched question), or None without a close enough match
+        """
+        normalized = normalize_question(question)
+        vector = embed(question, self.dim)
+        signature = _signature(question)
+        with self._lock:
+            slot = self._exact.get(normalized)
+            if slot is not None:
+                return self._answers[slot], 1.0, self._questions[slot]
+            if not self._size or not vector.any():
+                return None
+            scores = self._vectors[:self._size] @ vector
+            candidates = np.flatnonzero(scores >= self.threshold)
+            for best in candidates[np.argsort(-scores[candidates])]:
+                if self._signatures[best] == signature:
+                    return self._answers[best], float(scores[best]), self._questions[best]
+            return None
+
+    def add(self, question, answer):
+        normalized = normalize_question(question)
+        vector = embed(question, self.dim)
+        with self._lock:
+            slot = self._exact.get(normalized)
+            if slot is None:
+                slot = self._next
+                self._next = (self._next + 1) % self.max_entries
+                old = self._questions[slot]
+                if old is not None:
+                    self._exact.pop(normalize_question(old), None)
+                self._size = min(self._size + 1, self.max_entries)
+            if slot >= len(self._vectors):
+                grown = np.zeros((min(2 * len(self._vectors), self.max_entries), self.dim), dtype=np.float32)
+                grown[:len(self._vectors)] = self._vectors
+                self._vectors = grown
+            self._vectors[slot] = vector
+            self._questions[slot] = question
+            self._answers[slot] = answer
+            self._signatures[slot] = _signature(question)
+            self._exact[normalized] = slot
@@ -0,0 +1,411 @@
+"""
+LLM backends used by model.py for extraction, summary, quiz and chat calls.
+
+Every backend takes plain-text prompts (plus an optional video reference for
+multimodal extraction) and returns a Generation. Three implementations ship:
+
+- GeminiBackend: google-genai, one pooled client per API key
+- OpenAIBackend: any OpenAI-compatible chat completions endpoint
+- FakeBackend: deterministic local fake with configurable latency, streaming
+  rate, token counts and error rate, for load tests and offline benchmarks
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from contextlib import aclosing
+from typing import NamedTuple, Optional
+
+from cachetools import LRUCache
+
+
+class VideoInput(NamedTuple):
+    """A video to analyze, optionally restricted to [start, end) seconds."""
+    uri: str
+    start: Optional[int] = None
+    end: Optional[int] = None
+
+
+class Generation(NamedTuple):
+    """Generated text plus token usage ({"prompt_tokens", "output_tokens", "total_tokens"} or None)."""
+    text: str
+    usage: Optional[dict] = None
+
+
+def prompt_segments(prompt):
+    """
+    A prompt is a str or a sequence of str segments meant to be read in order.
+    model.py passes segments so a cached analysis is handed to the SDK as is
+    instead of being copied into a new prompt string on every request.
+    """
+    return (prompt,) if isinstance(prompt, str) else tuple(prompt)
+
+
+def prompt_text(prompt):
+    """The prompt as one str (for backends that can't send segments)."""
+    return prompt if isinstance(prompt, str) else "".join(prompt)
+
+
+class BackendError(Exception):
+    """An error returned by a backend, with the HTTP status code and retry hint (seconds) when known."""
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class LLMBackend:
+    """Interface every backend implements."""
+
+    name = "base"
+
+    def ensure_credentials(self):
+        """Raise RuntimeError if the current request has no usable API key."""
+
+    def warm(self):
+        """
+        Import the SDK and create the clients that don't depend on a request's
+        API key, so the first request doesn't pay for it (optional).
+        """
+
+    def generate(self, model, system_instruction, prompt, video=None):
+        """
+        Generate a complete response (blocking). Returns a Generation.
+
+        prompt is a str or a sequence of str segments (see prompt_segments).
+        """
+        raise NotImplementedError
+
+    async def agenerate(self, model, system_instruction, prompt, video=None):
+        """Generate a complete response without blocking the event loop."""
+        raise NotImplementedError
+
+    async def astream(self, model, system_instruction, prompt):
+        """Yield (text, usage) chunks as they are generated; usage is None until known."""
+        raise NotImplementedError
+        yield
+
+
+class _ClientPool:
+    """LRU pool of SDK clients keyed by API key.
+
+    Evicted clients are left to the garbage collector rather than closed,
+    since another request may still be using them.
+    """
+
+    def __init__(self, factory, size):
+        self._factory = factory
+        self._clients = LRUCache(maxsize=size)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._factory(key)
+                self._clients[key] = client
+            return client
+
+    def __len__(self):
+        with self._lock:
+            return len(self._clients)
+
+
+class GeminiBackend(LLMBackend):
+    """
+    Google Gemini via google-genai.
+
+    Args:
+        key_provider (callable): Returns the API key for the current request
+        pool_size (int): Max distinct API keys whose clients (and their HTTP
+            connection pools) are kept alive
+    """
+
+    name = "gemini"
+
+    def __init__(self, key_provider, pool_size=256):
+        self._key_provider = key_provider
+        self._pool = _ClientPool(self._new_client, pool_size)
+
+    @staticmethod
+    def _new_client(key):
+        # google-genai takes about half a second to import, so it is loaded with
+        # the first client rather than when the worker starts
+        from google import genai
+
+        return genai.Client(api_key=key)
+
+    def warm(self):
+        from google import genai  # noqa: F401
+        from google.genai import types  # noqa: F401
+
+    def ensure_credentials(self):
+        key = self._key_provider()
+        if not key:
+            raise RuntimeError(
+                "No Gemini API key provided. Pass X-API-Key from the extension or set GOOGLE_API_KEY in .env."
+            )
+        return key
+
+    def client(self):
+        """Return the pooled client for the active API key (serves .models and .aio.models)."""
+        return self._pool.get(self.ensure_credentials())
+
+    @staticmethod
+    def _request(system_instruction, prompt, video):
+        from google.genai import types
+
+        parts = []
+        if video is not None:
+            video_metadata = None
+            if video.start is not None:
+                video_metadata = types.VideoMetadata(start_offset=f"{video.start}s", end_offset=f"{video.end}s")
+            parts.append(types.Part(file_data=types.FileData(file_uri=video.uri), video_metadata=video_metadata))
+        # One text part per segment; the model reads them as one contiguous prompt
+        parts.extend(types.Part(text=segment) for segment in prompt_segments(prompt) if segment)
+        config = types.GenerateContentConfig(system_instruction=system_instruction)
+        return config, types.Content(parts=parts)
+
+    @staticmethod
+    def _usage(usage_metadata):
+        if usage_metadata is None:
+            return None
+        return {
+            "prompt_tokens": usage_metadata.prompt_token_count,
+            "output_tokens": usage_metadata.candidates_token_count,
+            "total_tokens": usage_metadata.total_token_count,
+        }
+
+    def generate(self, model, system_instruction, prompt, video=None):
+        config, contents = self._request(system_instruction, prompt, video)
+        response = self.client().models.generate_content(model=model, config=config, contents=contents)
+        return Generation(response.text, self._usage(response.usage_metadata))
+
+    async def agenerate(self, model, system_instruction, prompt, video=None):
+        config, contents = self._request(system_instruction, prompt, video)
+        response = await self.client().aio.models.generate_content(model=model, config=config, contents=contents)
+        return Generation(response.text, self._usage(response.usage_metadata))
+
+    async def astream(self, model, system_instruction, prompt):
+        config, contents = self._request(system_instruction, prompt, None)
+        stream = await self.client().aio.models.generate_content_stream(model=model, config=config, contents=contents)
+        async with aclosing(stream):
+            async for chunk in stream:
+                yield chunk.text or "", self._usage(chunk.usage_metadata)
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    Any OpenAI-compatible chat completions endpoint.
+
+    Text only: video extraction raises, so use it with the transcript tier.
+
+    Args:
+        key_provider (callable): Returns the request's API key; default_key is used if it returns None
+        base_url (str): Endpoint base URL (None = api.openai.com)
+        model_override (str): Model name to use for every call instead of the Gemini names
+        default_key (str): Fallback API key
+        pool_size (int): Max distinct API keys whose clients are kept alive
+    """
+
+    name = "openai"
+
+    def __init__(self, key_provider, base_url=None, model_override=None, default_key=None, pool_size=256):
+        self._key_provider = key_provider
+        self._default_key = default_key
+        self.model_override = model_override
+        self._sync_pool = _ClientPool(lambda key: self._new_client(key, base_url, asynchronous=False), pool_size)
+        self._async_pool = _ClientPool(lambda key: self._new_client(key, base_url, asynchronous=True), pool_size)
+
+    @staticmethod
+    def _new_client(key, base_url, asynchronous):
+        # Imported with the first client, like google-genai in GeminiBackend
+        from openai import AsyncOpenAI, OpenAI
+
+        return (AsyncOpenAI if asynchronous else OpenAI)(api_key=key, base_url=base_url)
+
+    def warm(self):
+        import openai  # noqa: F401
+
+        if self._default_key:
+            self._sync_pool.get(self._default_key)
+            self._async_pool.get(self._default_key)
+
+    def ensure_credentials(self):
+        key = self._key_provider() or self._default_key
+        if not key:
+            raise RuntimeError("No API key provided for the OpenAI-compatible backend.")
+        return key
+
+    def _messages(self, system_instruction, prompt, video):
+        if video is not None:
+            raise BackendError("The OpenAI-compatible backend cannot analyze video input", status_code=400)
+        # Content-part arrays aren't supported by every compatible server, so join
+        return [
+            {"role": "system", "content": system_instruction},
+            {"role": "user", "content": prompt_text(prompt)},
+        ]
+
+    @staticmethod
+    def _usage(usage):
+        if usage is None:
+            return None
+        return {
+            "prompt_tokens": usage.prompt_tokens,
+            "output_tokens": usage.completion_tokens,
+            "total_tokens": usage.total_tokens,
+        }
+
+    def generate(self, model, system_instruction, prompt, video=None):
+        messages = self._messages(system_instruction, prompt, video)
+        response = self._sync_pool.get(self.ensure_credentials()).chat.completions.create(
+            model=self.model_override or model, messages=messages
+        )
+        return Generation(response.choices[0].message.content or "", self._usage(response.usage))
+
+    async def agenerate(self, model, system_instruction, prompt, video=None):
+        messages = self._messages(system_instruction, prompt, video)
+        response = await self._async_pool.get(self.ensure_credentials()).chat.completions.create(
+            model=self.model_override or model, messages=messages
+        )
+        return Generation(response.choices[0].message.content or "", self._usage(response.usage))
+
+    async def astream(self, model, system_instruction, prompt):
+        stream = await self._async_pool.get(self.ensure_credentials()).chat.completions.create(
+            model=self.model_override or model,
+            messages=self._messages(system_instruction, prompt, None),
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        try:
+            async for chunk in stream:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                yield text or "", self._usage(chunk.usage)
+        finally:
+            await stream.close()
+
+
+_WORDS = (
+    "energy system model process data cell signal network theory method result "
+    "structure function value example concept analysis equation reaction force "
+    "market history language pattern memory learning design evidence principle"
+).split()
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic local stand-in for a real LLM service.
+
+    Output text depends only on the prompt, so repeated runs are comparable.
+    Quiz and summary tree prompts get valid JSON so the whole app can be exercised.
+
+    Args:
+        latency (float): Seconds before the first token
+        tokens_per_second (float): Streaming rate after the first token
+        output_tokens (int): Tokens per response
+        error_rate (float): Probability (0-1) that a call fails with a 503
+        seed (int): Seed for the error-injection RNG
+    """
+
+    name = "fake"
+
+    def __init__(self, latency=0.5, tokens_per_second=200.0, output_tokens=400, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.calls = 0
+
+    def _should_fail(self):
+        with self._rng_lock:
+            self.calls += 1
+            return self.error_rate > 0 and self._rng.random() < self.error_rate
+
+    def _duration(self):
+        return self.latency + self.output_tokens / self.tokens_per_second
+
+    @staticmethod
+    def _usage(prompt, output_tokens):
+        prompt_tokens = sum(map(len, prompt_segments(prompt))) // 4 + 1
+        return {"prompt_tokens": prompt_tokens, "output_tokens": output_tokens, "total_tokens": prompt_tokens + output_tokens}
+
+    def _text(self, system_instruction, prompt):
+        digest = hashlib.sha256(system_instruction.encode("utf-8"))
+        for segment in prompt_segments(prompt):
+            digest.update(segment.encode("utf-8"))
+        rng = random.Random(digest.digest())
+        if '"questions"' in system_instruction:
+            match = re.search(r"Generate (\d+) questions", system_instruction)
+            return self._quiz(rng, int(match.group(1)) if match else 5)
+        if '"sections"' in system_instruction:
+            match = re.search(r"about (\d+) words", prompt_segments(prompt)[-1])
+            return self._summary_tree(rng, int(match.group(1)) if match else 1000)
+
+        words = [rng.choice(_WORDS) for _ in range(self.output_tokens)]
+        lines = ["# Fake " + " ".join(words[:3]).title()]
+        for start in range(3, len(words), 60):
+            lines.append(f"\n## Section {start // 60 + 1}: {' '.join(words[start:start + 2])}")
+            lines.append("- " + " ".join(words[start + 2:start + 60]) + ".")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _quiz(rng, num_questions):
+        questions = []
+        for i in range(num_questions):
+            topic = " ".join(rng.choice(_WORDS) for _ in range(3))
+            questions.append({
+                "question": f"Question {i + 1}: which statement about the {topic} is correct?",
+                "options": {letter: f"The {rng.choice(_WORDS)} {rng.choice(_WORDS)}" for letter in "ABCD"},
+                "correct_answer": rng.choice("ABCD"),
+                "explanation": f"The video explains the {topic}.",
+            })
+        return json.dumps({"questions": questions})
+
+    @staticmethod
+    def _summary_tree(rng, words):
+        def sentence(length):
+            return " ".join(rng.choice(_WORDS) for _ in range(length)).capitalize() + "."
+
+        sections = []
+        for i in range(5):
+            points = [sentence(15) for _ in range(max(1, words // (5 * 16)))]
+            sections.append({"heading": f"Section {i + 1}: {sentence(2)[:-1]}", "summary": sentence(12), "points": points})
+        return json.dumps({
+            "title": "Fake " + sentence(3)[:-1].title(),
+            "introduction": sentence(20) + " " + sentence(20),
+            "takeaways": [sentence(12) for _ in range(4)],
+            "sections": sections,
+        })
+
+    def generate(self, model, system_instruction, prompt, video=None):
+        fail = self._should_fail()
+        time.sleep(self._duration())
+        if fail:
+            raise BackendError("Fake backend injected error", status_code=503)
+        return Generation(self._text(system_instruction, prompt), self._usage(prompt, self.output_tokens))
+
+    async def agenerate(self, model, system_instruction, prompt, video=None):
+        fail = self._should_fail()
+        await asyncio.sleep(self._duration())
+        if fail:
+            raise BackendError("Fake backend injected error", status_code=503)
+        return Generation(self._text(system_instruction, prompt), self._usage(prompt, self.output_tokens))
+
+    async def astream(self, model, system_instruction, prompt):
+        fail = self._should_fail()
+        await asyncio.sleep(self.latency)
+        if fail:
+            raise BackendError("Fake backend injected error", status_code=503)
+        pieces = re.findall(r"\S+\s*", self._text(system_instruction, prompt))
+        per_chunk = 8
+        for i in range(0, len(pieces), per_chunk):
+            if i:
+                await asyncio.sleep(per_chunk / self.tokens_per_second)
+            yield "".join(pieces[i:i + per_chunk]), None
+        yield "", self._usage(prompt, len(pieces))
@@ -0,0 +1,638 @@
+"""
+Benchmark and load-test the SmartEd API against a stubbed model backend.
+
+The app runs with a FakeBackend, static captions and static video durations,
+so runs are reproducible, offline and free. Three ways to drive it:
+
+    python benchmark.py                               # in-process (httpx ASGITransport)
+    python benchmark.py --transport uvicorn           # spawns a stubbed uvicorn server, real sockets
+    python benchmark.py --serve --port 8765           # only run the stubbed server
+    python benchmark.py --target http://host:8765     # drive an already-running server
+    python benchmark.py --startup                     # cold-start: import, warm-up, first request
+
+For every (URL distribution, concurrency) level the caches are cleared, a
+fixed, seeded request plan is replayed by that many concurrent clients, and
+p50/p95/p99 latency, throughput, error counts, video/output cache hit rates,
+coalesced extractions, model calls and event-loop lag are reported. --output
+writes the same numbers as JSON so two releases can be diffed.
+
+Server-side numbers (cache, extraction, event loop) come from /_bench routes
+that only exist in the stubbed app; against any other server they are null.
+In-process, the event loop measured is the one shared by the app and the
+clients.
+
+--startup measures cold starts instead: each run is a fresh interpreter that
+imports the app with the configured LLM_BACKEND (default gemini, no calls
+are made), runs the lifespan startup (warm-up per STARTUP_WARMUP), then sends
+two requests to the stubbed app. sdk_ms is what initializing the real SDK
+still costs afterwards, i.e. what the first real model call would pay.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+QUESTIONS = (
+    "What is the main idea of the video?",
+    "How does the energy model work?",
+    "Can you explain the data analysis method again?",
+    "What example is given for the signal network?",
+    "Which equation describes the reaction force?",
+    "What evidence supports the learning principle?",
+)
+
+# name -> (path, streams over SSE, payload builder(url, rng))
+ENDPOINTS = {
+    "summarize": ("/summarize", False, lambda url, rng: {"url": url, "max_length": 800}),
+    "quiz": ("/quiz", False, lambda url, rng: {"url": url, "num_questions": 5}),
+    "chat": ("/chat", False, lambda url, rng: {"url": url, "question": str(rng.choice(QUESTIONS)), "history": []}),
+    "preload": ("/preload", False, lambda url, rng: {"url": url}),
+    "complete-analysis": ("/complete-analysis", False, lambda url, rng: {"url": url}),
+    "summarize-stream": ("/summarize/stream", True, lambda url, rng: {"url": url, "max_length": 800}),
+    "chat-stream": ("/chat/stream", True, lambda url, rng: {"url": url, "question": str(rng.choice(QUESTIONS)), "history": []}),
+}
+
+DEFAULT_ENDPOINTS = "summarize,quiz,chat,preload,complete-analysis"
+
+_WORDS = (
+    "today we look at how the energy in a system changes when the model of the "
+    "process uses data from each cell and signal in the network so the theory and "
+    "method give a clear result for the structure and function of every value"
+).split()
+
+
+def _video_id(i):
+    return f"bench{i:06d}"
+
+
+def _video_url(i):
+    return f"https://www.youtube.com/watch?v={_video_id(i)}"
+
+
+def build_catalog(videos, caption_ratio, long_ratio, seed):
+    """
+    Deterministic set of fake videos.
+
+    Returns:
+        tuple: (captions {video_id: snippets}, durations {video_id: seconds})
+    """
+    rng = np.random.default_rng(seed)
+    captions = {}
+    durations = {}
+    for i in range(videos):
+        duration = 90 * 60 if rng.random() < long_ratio else 10 * 60
+        durations[_video_id(i)] = duration
+        if rng.random() < caption_ratio:
+            captions[_video_id(i)] = [
+                {"text": " ".join(rng.choice(_WORDS, 12)), "start": float(start), "duration": 5.0}
+                for start in range(0, duration, 5)
+            ]
+    return captions, durations
+
+
+class LoopLagMonitor:
+    """
+    Measure event-loop blocking: a task sleeps for interval and records how
+    late it wakes up. Lateness is time the loop spent unable to run callbacks.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self._lags = []
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self._lags.append(max(0.0, loop.time() - expected))
+
+    def reset(self):
+        self._lags = []
+
+    def stats(self):
+        if not self._lags:
+            return None
+        lags = np.array(self._lags) * 1000
+        return {
+            "samples": len(lags),
+            "mean_ms": round(float(lags.mean()), 2),
+            "p99_ms": round(float(np.percentile(lags, 99)), 2),
+            "max_ms": round(float(lags.max()), 2),
+            "blocked_ms": round(float(lags.sum()), 1),
+            "stalls_over_50ms": int((lags > 50).sum()),
+        }
+
+
+def _hit_rate(hits, misses):
+    lookups = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": round(hits / lookups, 4) if lookups else None}
+
+
+class BenchProbe:
+    """Server-side counters for one benchmark level, as deltas since reset()."""
+
+    def __init__(self, model):
+        self.model = model
+        self.lag = LoopLagMonitor()
+        self._baseline = None
+
+    def _counters(self):
+        cache = self.model.get_cache_stats()
+        output = self.model.get_output_cache_stats()
+        extraction = self.model.get_extraction_stats()
+        return {
+            "cache_hits": cache["hits"],
+            "cache_misses": cache["misses"],
+            "output_hits": output["hits"],
+            "output_misses": output["misses"],
+            "extractions": extraction["leaders"],
+            "coalesced": extraction["coalesced"],
+            "llm_calls": getattr(self.model.get_backend(), "calls", 0),
+        }
+
+    def reset(self):
+        """Clear the video and output caches and start a new measurement window (call from the event loop)."""
+        self.model.clear_video_cache()
+        self.lag.start()
+        self.lag.reset()
+        self._baseline = self._counters()
+
+    def report(self):
+        now = self._counters()
+        delta = {name: now[name] - self._baseline.get(name, 0) for name in now}
+        return {
+            "video_cache": _hit_rate(delta["cache_hits"], delta["cache_misses"]),
+            "output_cache": _hit_rate(delta["output_hits"], delta["output_misses"]),
+            "extraction": {"extractions": delta["extractions"], "coalesced": delta["coalesced"]},
+            "llm_calls": delta["llm_calls"],
+            "event_loop": self.lag.stats(),
+        }
+
+
+def build_app(args):
+    """Import the app with a FakeBackend and static caption/duration stubs installed."""
+    # Must be set before model is imported: no shared store, no Gemini client
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ.setdefault("EXTRACTION_STORE_PATH", "")
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+
+    import model
+    from backends import FakeBackend
+    from main import app
+    from segments import StaticDurationProbe
+    from transcripts import StaticTranscriptFetcher
+
+    captions, durations = build_catalog(args.videos, args.caption_ratio, args.long_ratio, args.seed)
+    model.set_backend(FakeBackend(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        output_tokens=args.output_tokens,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    ))
+    model.set_transcript_fetcher(StaticTranscriptFetcher(captions))
+    model.set_duration_probe(StaticDurationProbe(durations))
+
+    probe = BenchProbe(model)
+
+    @app.post("/_bench/reset")
+    async def bench_reset():
+        probe.reset()
+        return {"ok": True}
+
+    @app.get("/_bench/stats")
+    async def bench_stats():
+        return probe.report()
+
+    return app, probe
+
+
+class _LocalProbe:
+    def __init__(self, probe):
+        self._probe = probe
+
+    async def reset(self):
+        self._probe.reset()
+
+    async def report(self):
+        return self._probe.report()
+
+
+class _RemoteProbe:
+    """Reach the probe over /_bench; quietly reports None if the server has no such routes."""
+
+    def __init__(self, client):
+        self._client = client
+        self.available = True
+
+    async def reset(self):
+        response = await self._client.post("/_bench/reset")
+        self.available = response.status_code == 200
+
+    async def report(self):
+        if not self.available:
+            return None
+        return (await self._client.get("/_bench/stats")).json()
+
+
+def plan_requests(endpoints, distribution, count, videos, zipf_s, seed):
+    """Seeded list of (endpoint, url, payload) for one level."""
+    rng = np.random.default_rng(seed)
+    if distribution == "uniform":
+        picks = rng.integers(0, videos, count)
+    elif distribution == "zipf":
+        weights = 1.0 / np.arange(1, videos + 1) ** zipf_s
+        picks = rng.choice(videos, count, p=weights / weights.sum())
+    elif distribution == "single":
+        picks = np.zeros(count, dtype=int)
+    else:
+        raise ValueError(f"Unknown distribution: {distribution!r}")
+
+    plan = []
+    for pick in picks:
+        name = str(rng.choice(endpoints))
+        url = _video_url(int(pick))
+        plan.append((name, url, ENDPOINTS[name][2](url, rng)))
+    return plan
+
+
+async def _send(client, name, payload, headers=None):
+    """Issue one request; returns (endpoint, ok, status, latency_ms, server ttft_ms)."""
+    path, streaming, _ = ENDPOINTS[name]
+    started = time.perf_counter()
+    ttft_ms = None
+    try:
+        if streaming:
+            ok = False
+            async with client.stream("POST", path, json=payload, headers=headers) as response:
+                status = response.status_code
+                event = None
+                async for line in response.aiter_lines():
+                    if line.startswith("event: "):
+                        event = line[7:]
+                    elif line.startswith("data: ") and event == "done":
+                        ok = 200 <= status < 300
+                        ttft_ms = json.loads(line[6:]).get("ttft_ms")
+        else:
+            response = await client.post(path, json=payload, headers=headers)
+            status = response.status_code
+            ok = 200 <= status < 300
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+        ok = False
+    return name, ok, status, (time.perf_counter() - started) * 1000, ttft_ms
+
+
+def _latency_summary(values):
+    if not values:
+        return None
+    values = np.asarray(values)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 1),
+        "p95": round(float(p95), 1),
+        "p99": round(float(p99), 1),
+        "mean": round(float(values.mean()), 1),
+        "max": round(float(values.max()), 1),
+    }
+
+
+def summarize_samples(samples):
+    """Aggregate latency/error numbers over (endpoint, ok, status, latency_ms, ttft_ms) samples."""
+    errors = [s for s in samples if not s[1]]
+    statuses = {}
+    for s in errors:
+        statuses[str(s[2])] = statuses.get(str(s[2]), 0) + 1
+    ttfts = [s[4] for s in samples if s[4] is not None]
+    return {
+        "requests": len(samples),
+        "errors": len(errors),
+        "error_statuses": statuses,
+        "latency_ms": _latency_summary([s[3] for s in samples]),
+        "ttft_ms": _latency_summary(ttfts),
+    }
+
+
+async def run_level(client, probe, plan, concurrency):
+    """
+    Replay plan with `concurrency` closed-loop clients and collect the results.
+    Each client is a separate user (its own X-API-Key), as the server's
+    per-key admission limits expect.
+    """
+    await probe.reset()
+    pending = iter(plan)
+    samples = []
+
+    async def worker(user):
+        headers = {"X-API-Key": f"bench-user-{user}"}
+        for name, _, payload in pending:
+            samples.append(await _send(client, name, payload, headers))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(user) for user in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    result = summarize_samples(samples)
+    result["duration_s"] = round(elapsed, 3)
+    result["throughput_rps"] = round(len(samples) / elapsed, 2) if elapsed else None
+    result["endpoints"] = {
+        name: summarize_samples([s for s in samples if s[0] == name])
+        for name in sorted({s[0] for s in samples})
+    }
+    result["server"] = await probe.report()
+    return result
+
+
+def _print_row(distribution, concurrency, result):
+    latency = result["latency_ms"] or {}
+    server = result["server"] or {}
+    hit_rate = (server.get("video_cache") or {}).get("hit_rate")
+    extraction = server.get("extraction") or {}
+    loop = server.get("event_loop") or {}
+    print(
+        f"{distribution:>8} {concurrency:>5} {result['throughput_rps'] or 0:>9.1f} "
+        f"{latency.get('p50', 0):>9.1f} {latency.get('p95', 0):>9.1f} {latency.get('p99', 0):>9.1f} "
+        f"{result['errors']:>6} "
+        f"{'-' if hit_rate is None else f'{hit_rate:.0%}':>6} "
+        f"{extraction.get('extractions', '-'):>5} {extraction.get('coalesced', '-'):>5} "
+        f"{loop.get('max_ms', '-'):>9}",
+        flush=True,
+    )
+
+
+async def run_benchmark(args, client, probe):
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = [e for e in endpoints if e not in ENDPOINTS]
+    if unknown:
+        raise SystemExit(f"Unknown endpoints: {', '.join(unknown)} (choose from {', '.join(ENDPOINTS)})")
+
+    print(f"{'dist':>8} {'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'errors':>6} {'hits':>6} {'extr':>5} {'coal':>5} {'loop max':>9}")
+    levels = []
+    for distribution in args.distribution.split(","):
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            plan = plan_requests(endpoints, distribution, args.requests, args.videos, args.zipf_s, args.seed)
+            result = await run_level(client, probe, plan, concurrency)
+            _print_row(distribution, concurrency, result)
+            levels.append({"distribution": distribution, "concurrency": concurrency, **result})
+    return levels
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _report(args, transport, levels):
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "transport": transport,
+        },
+        "config": {
+            "endpoints": args.endpoints,
+            "requests_per_level": args.requests,
+            "videos": args.videos,
+            "zipf_s": args.zipf_s,
+            "caption_ratio": args.caption_ratio,
+            "long_ratio": args.long_ratio,
+            "fake_backend": {
+                "latency": args.latency,
+                "tokens_per_second": args.tokens_per_second,
+                "output_tokens": args.output_tokens,
+                "error_rate": args.error_rate,
+            },
+            "seed": args.seed,
+        },
+        "levels": levels,
+    }
+
+
+def _client_limits(args):
+    most = max(int(c) for c in args.concurrency.split(","))
+    return httpx.Limits(max_connections=most, max_keepalive_connections=most)
+
+
+async def _run_in_process(args):
+    app, probe = build_app(args)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+        return await run_benchmark(args, client, _LocalProbe(probe))
+
+
+async def _run_remote(args, base_url):
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=_client_limits(args)) as client:
+        return await run_benchmark(args, client, _RemoteProbe(client))
+
+
+def _stub_args(args):
+    """Command-line flags that configure the stubbed app, for a spawned --serve process."""
+    return [
+        "--videos", str(args.videos),
+        "--caption-ratio", str(args.caption_ratio),
+        "--long-ratio", str(args.long_ratio),
+        "--latency", str(args.latency),
+        "--tokens-per-second", str(args.tokens_per_second),
+        "--output-tokens", str(args.output_tokens),
+        "--error-rate", str(args.error_rate),
+        "--seed", str(args.seed),
+    ]
+
+
+def _spawn_server(args):
+    """Start `benchmark.py --serve` in a subprocess and wait until it answers."""
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", "--host", args.host, "--port", str(args.port), *_stub_args(args)],
+        cwd=BACKEND_DIR,
+    )
+    base_url = f"http://{args.host}:{args.port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"Benchmark server exited with code {server.returncode}")
+        try:
+            httpx.get(base_url + "/", timeout=1)
+            return server, base_url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit("Benchmark server did not start within 30s")
+
+
+# Run in a fresh interpreter so `import main` is timed before anything else is loaded
+_STARTUP_CHILD = (
+    "import sys, time; started = time.perf_counter(); import main; imported = time.perf_counter(); "
+    "import benchmark; benchmark.startup_child(started, imported, sys.argv[1:])"
+)
+
+STARTUP_METRICS = ("import_ms", "startup_ms", "first_request_ms", "second_request_ms", "sdk_ms")
+
+
+async def _startup_requests(args, started, imported):
+    import model
+    from main import app
+
+    timings = {"import_ms": (imported - started) * 1000}
+    real_backend = model.get_backend()
+    build_app(args)
+    # The fake answers the requests, but warm-up still initializes the real SDK
+    model.get_backend().warm = real_backend.warm
+    lifespan_started = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        timings["startup_ms"] = (time.perf_counter() - lifespan_started) * 1000
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+            for name, i in (("first_request_ms", 0), ("second_request_ms", 1)):
+                _, ok, status, latency_ms, _ = await _send(client, "summarize", {"url": _video_url(i), "max_length": 800})
+                if not ok:
+                    raise SystemExit(f"Startup request failed with {status}")
+                timings[name] = latency_ms
+    sdk_started = time.perf_counter()
+    real_backend.warm()
+    timings["sdk_ms"] = (time.perf_counter() - sdk_started) * 1000
+    return {name: round(value, 1) for name, value in timings.items()}
+
+
+def startup_child(started, imported, argv):
+    """Entry point of one --startup run; prints its timings as JSON."""
+    args = parse_args(argv)
+    print(json.dumps(asyncio.run(_startup_requests(args, started, imported))))
+
+
+def run_startup(args):
+    """Time --startup-runs cold starts, each in a new interpreter."""
+    env = dict(os.environ)
+    env.setdefault("LLM_BACKEND", "gemini")
+    env.setdefault("EXTRACTION_STORE_PATH", "")
+    env["STARTUP_WARMUP"] = args.warmup
+    runs = []
+    for _ in range(args.startup_runs):
+        result = subprocess.run(
+            [sys.executable, "-c", _STARTUP_CHILD, *_stub_args(args)],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=args.timeout,
+        )
+        if result.returncode != 0:
+            raise SystemExit(f"Startup run failed:\n{result.stderr}")
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    summary = {}
+    print(f"{'':>18} {'median':>9} {'min':>9} {'max':>9}")
+    for name in STARTUP_METRICS:
+        values = [run[name] for run in runs]
+        summary[name] = {"median": float(np.median(values)), "min": min(values), "max": max(values)}
+        print(f"{name:>18} {summary[name]['median']:9.1f} {summary[name]['min']:9.1f} {summary[name]['max']:9.1f}")
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "llm_backend": env["LLM_BACKEND"],
+            "warmup": args.warmup,
+        },
+        "summary": summary,
+        "runs": runs,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    mode = parser.add_argument_group("mode")
+    mode.add_argument("--transport", choices=("asgi", "uvicorn"), default="asgi",
+                      help="asgi: in-process; uvicorn: spawn a stubbed server on --host/--port")
+    mode.add_argument("--target", help="Base URL of an already-running server (overrides --transport)")
+    mode.add_argument("--serve", action="store_true", help="Only run the stubbed app under uvicorn")
+    mode.add_argument("--host", default="127.0.0.1")
+    mode.add_argument("--port", type=int, default=8765)
+    mode.add_argument("--startup", action="store_true", help="Measure cold starts instead of load")
+    mode.add_argument("--startup-runs", type=int, default=5, help="Cold starts to time with --startup")
+    mode.add_argument("--warmup", default="background", help="STARTUP_WARMUP for --startup runs: background, 1 or 0")
+
+    load = parser.add_argument_group("load")
+    load.add_argument("--endpoints", default=DEFAULT_ENDPOINTS,
+                      help=f"Comma-separated mix, picked uniformly per request (from: {', '.join(ENDPOINTS)})")
+    load.add_argument("--concurrency", default="1,4,16,64", help="Comma-separated concurrency levels")
+    load.add_argument("--requests", type=int, default=200, help="Requests per level")
+    load.add_argument("--distribution", default="uniform,zipf,single",
+                      help="Comma-separated URL reuse distributions: uniform, zipf, single")
+    load.add_argument("--zipf-s", type=float, default=1.1, help="Zipf exponent (higher = more reuse)")
+    load.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    load.add_argument("--output", help="Write the JSON report here")
+
+    stub = parser.add_argument_group("stubbed app")
+    stub.add_argument("--videos", type=int, default=50, help="Distinct videos in the catalog")
+    stub.add_argument("--caption-ratio", type=float, default=0.5, help="Fraction of videos with usable captions")
+    stub.add_argument("--long-ratio", type=float, default=0.1, help="Fraction of 90-minute (segmented) videos")
+    stub.add_argument("--latency", type=float, default=0.05, help="Fake model seconds to first token")
+    stub.add_argument("--tokens-per-second", type=float, default=4000.0, help="Fake model output rate")
+    stub.add_argument("--output-tokens", type=int, default=400, help="Fake model tokens per response")
+    stub.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake model calls failing with 503")
+    stub.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.serve:
+        import uvicorn
+
+        app, _ = build_app(args)
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+        return
+
+    if args.startup:
+        report = run_startup(args)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"Wrote {args.output}")
+        return
+
+    if args.target:
+        transport = f"remote {args.target}"
+        levels = asyncio.run(_run_remote(args, args.target.rstrip("/")))
+    elif args.transport == "uvicorn":
+        server, base_url = _spawn_server(args)
+        transport = f"uvicorn {base_url}"
+        try:
+            levels = asyncio.run(_run_remote(args, base_url))
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+    else:
+        transport = "asgi"
+        levels = asyncio.run(_run_in_process(args))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(_report(args, transport, levels), f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
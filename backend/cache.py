@@ -0,0 +1,271 @@
+"""
+Bounded in-memory cache for extracted video content.
+
+Entries are evicted least-recently-used once the total size exceeds a byte
+budget, and expire after a per-entry TTL. Errors are cached too, but only for a
+short negative TTL so a transient Gemini failure does not poison a URL.
+
+Large text values are kept zlib-compressed (analyses compress several-fold),
+so the byte budget holds that many more videos. A small hot set keeps the
+most recently read values decompressed; a hot read returns the same str
+object every time, so its hash (used in derived cache keys) is computed once.
+"""
+import sys
+import threading
+import time
+import zlib
+
+from cachetools import LRUCache, TLRUCache
+
+
+class HotSet:
+    """LRU of decompressed values for the most recently read compressed entries."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = LRUCache(maxsize=max(1, max_entries))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.decompressions = 0
+
+    def get(self, entry):
+        with self._lock:
+            text = self._data.get(entry)
+            if text is not None:
+                self.hits += 1
+                return text
+        text = zlib.decompress(entry._blob).decode("utf-8")
+        with self._lock:
+            self.decompressions += 1
+            # Another reader may have decompressed it meanwhile; keep a single copy
+            text = self._data.get(entry, text)
+            if self.max_entries > 0:
+                self._data[entry] = text
+        return text
+
+    def put(self, entry, text):
+        if self.max_entries > 0:
+            with self._lock:
+                self._data[entry] = text
+
+    def __contains__(self, entry):
+        with self._lock:
+            return entry in self._data
+
+    def discard(self, entry):
+        with self._lock:
+            self._data.pop(entry, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": sum(sys.getsizeof(text) for text in self._data.values()),
+                "hits": self.hits,
+                "decompressions": self.decompressions,
+            }
+
+
+class CacheEntry:
+    """
+    A cached extraction result plus the bookkeeping the cache needs.
+
+    With a hot set, str values of at least compress_min_bytes are stored
+    compressed and decompressed on read through the hot set; size is then
+    the compressed size and raw_size what the str would take.
+    """
+
+    __slots__ = ("_value", "_blob", "_hot", "is_error", "ttl", "created_at", "size", "raw_size", "meta")
+
+    def __init__(self, value, is_error=False, ttl=None, meta=None, hot=None, compress_min_bytes=None):
+        self.is_error = is_error
+        self.ttl = ttl
+        self.created_at = time.time()
+        self.raw_size = sys.getsizeof(value)
+        self.meta = meta or {}
+        self._hot = hot
+        if hot is not None and compress_min_bytes and isinstance(value, str) and not is_error \
+                and len(value) >= compress_min_bytes:
+            self._value = None
+            self._blob = zlib.compress(value.encode("utf-8"), 6)
+            self.size = sys.getsizeof(self._blob)
+            # Just written, so likely read next (e.g. the outputs derived from an extraction)
+            hot.put(self, value)
+        else:
+            self._value = value
+            self._blob = None
+            self.size = self.raw_size
+
+    @property
+    def value(self):
+        if self._blob is None:
+            return self._value
+        return self._hot.get(self)
+
+    @property
+    def compressed(self):
+        return self._blob is not None
+
+    def _forget(self):
+        if self._blob is not None:
+            self._hot.discard(self)
+
+
+class _CountingTLRUCache(TLRUCache):
+    """TLRUCache that counts size evictions and TTL expirations."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.evictions = 0
+        self.expirations = 0
+
+    def popitem(self):
+        item = super().popitem()
+        self.evictions += 1
+        item[1]._forget()
+        return item
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self.expirations += len(expired)
+        for _, entry in expired:
+            entry._forget()
+        return expired
+
+
+class VideoCache:
+    """
+    Thread-safe, byte-budgeted LRU cache with per-entry TTL.
+
+    Args:
+        max_bytes (int): Total size budget for all cached values
+        ttl (float): Seconds a successful extraction stays valid
+        error_ttl (float): Seconds an error result stays valid
+        compress_min_bytes (int): Store str values at least this long compressed (0 = never)
+        hot_entries (int): Compressed values kept decompressed for fast reads
+    """
+
+    def __init__(self, max_bytes, ttl, error_ttl, compress_min_bytes=0, hot_entries=16):
+        self.max_bytes = max_bytes
+        self.compress_min_bytes = compress_min_bytes
+        self._hot = HotSet(hot_entries) if compress_min_bytes else None
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self._lock = threading.RLock()
+        self._data = _CountingTLRUCache(
+            maxsize=max_bytes,
+            ttu=self._time_to_use,
+            getsizeof=lambda entry: entry.size,
+        )
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def _time_to_use(self, key, entry, now):
+        if entry.ttl is not None:
+            return now + entry.ttl
+        return now + (self.error_ttl if entry.is_error else self.ttl)
+
+    def get(self, key):
+        """Return the live CacheEntry for key, or None (counts a hit or miss)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def peek(self, key):
+        """Return the live CacheEntry for key, or None, without counting a hit or miss."""
+        with self._lock:
+            self._data.expire()
+            return self._data.get(key) if key in self._data else None
+
+    def set(self, key, value, is_error=False, ttl=None, **meta):
+        """Cache value under key (ttl overrides the default); oversized values are not cached."""
+        entry = CacheEntry(
+            value, is_error=is_error, ttl=ttl, meta=meta, hot=self._hot, compress_min_bytes=self.compress_min_bytes
+        )
+        with self._lock:
+            previous = self._data.get(key)
+            try:
+                self._data[key] = entry
+            except ValueError:
+                # Larger than the whole budget
+                entry._forget()
+                self.rejected += 1
+                return None
+            if previous is not None:
+                previous._forget()
+        return entry
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                entry._forget()
+            return entry
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            self._data.expire()
+            return len(self._data)
+
+    def keys(self):
+        """Keys of live (unexpired) entries."""
+        with self._lock:
+            self._data.expire()
+            return list(self._data.keys())
+
+    def items(self):
+        with self._lock:
+            self._data.expire()
+            items = [(key, self._data.get(key)) for key in list(self._data.keys())]
+            return [(key, entry) for key, entry in items if entry is not None]
+
+    def clear(self):
+        with self._lock:
+            # MutableMapping.clear() goes through popitem(); don't count those as evictions
+            evictions = self._data.evictions
+            self._data.clear()
+            self._data.evictions = evictions
+            if self._hot is not None:
+                self._hot.clear()
+
+    def stats(self):
+        """Hit/miss/eviction counters and current size."""
+        with self._lock:
+            self._data.expire()
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._data.currsize,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self._data.evictions,
+                "expirations": self._data.expirations,
+                "rejected": self.rejected,
+                "raw_bytes": sum(entry.raw_size for entry in self._data.values()),
+                "hot": self._hot.stats() if self._hot is not None else None,
+            }
+
+    def memory(self):
+        """Per-entry memory: [(key, stored bytes, uncompressed bytes, decompressed in the hot set)]."""
+        with self._lock:
+            self._data.expire()
+            entries = [(key, self._data.get(key)) for key in list(self._data.keys())]
+        return [
+            (key, entry.size, entry.raw_size, entry.compressed and entry in self._hot)
+            for key, entry in entries if entry is not None
+        ]
@@ -0,0 +1,153 @@
+"""
+Token-budgeted chat history.
+
+The last few turns are kept verbatim; older turns are folded into a rolling
+summary. Summaries are cached by a hash of the conversation prefix they cover,
+and the prefix only advances in blocks of turns, so a conversation triggers one
+summarization per block instead of one per question.
+"""
+import hashlib
+import json
+import threading
+
+from cachetools import LRUCache
+
+from retrieval import estimate_tokens
+
+
+def format_turns(turns, start=0):
+    """Format Q/A turns the way the chat prompt expects, numbered from start + 1."""
+    return "\n".join(
+        f"Q{start + idx + 1}: {turn.get('question', '')}\nA{start + idx + 1}: {turn.get('answer', '')}"
+        for idx, turn in enumerate(turns)
+    )
+
+
+def _prefix_keys(turns):
+    """Hash of every conversation prefix: keys[n] identifies turns[:n]."""
+    digest = hashlib.sha1()
+    keys = [digest.hexdigest()]
+    for turn in turns:
+        digest.update(json.dumps([turn.get("question", ""), turn.get("answer", "")]).encode("utf-8"))
+        keys.append(digest.hexdigest())
+    return keys
+
+
+class HistoryManager:
+    """
+    Fit chat history into a hard token budget.
+
+    Args:
+        token_budget (int): Max tokens for the formatted history
+        keep_turns (int): Most recent turns always kept verbatim (budget permitting)
+        fold_turns (int): Older turns are folded into the summary this many at a time
+        cache_size (int): Number of prefix summaries kept
+    """
+
+    def __init__(self, token_budget, keep_turns, fold_turns, cache_size=1024):
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.fold_turns = max(1, fold_turns)
+        self._summaries = LRUCache(maxsize=cache_size)
+        self._lock = threading.Lock()
+        self.summaries_built = 0
+        self.summary_hits = 0
+
+    def _plan(self, history):
+        """
+        Decide how much of history to fold.
+
+        Returns:
+            tuple | None: (fold_upto, prefix_keys) or None if history fits as is
+        """
+        if estimate_tokens(format_turns(history)) <= self.token_budget:
+            return None
+        keys = _prefix_keys(history)
+        older = max(0, len(history) - self.keep_turns)
+        fold_upto = older - older % self.fold_turns
+        # Recent turns alone may blow the budget; fold more of them, block by block
+        while fold_upto < len(history) and estimate_tokens(format_turns(history[fold_upto:], fold_upto)) > self.token_budget:
+            fold_upto = min(len(history), fold_upto + self.fold_turns)
+        return fold_upto, keys
+
+    def _cached_base(self, keys, fold_upto):
+        """Longest cached summary for a prefix no longer than fold_upto: (length, summary)."""
+        with self._lock:
+            for n in range(fold_upto, 0, -1):
+                summary = self._summaries.get(keys[n])
+                if summary is not None:
+                    if n == fold_upto:
+                        self.summary_hits += 1
+                    return n, summary
+        return 0, ""
+
+    def _store(self, keys, n, summary):
+        with self._lock:
+            self._summaries[keys[n]] = summary
+            self.summaries_built += 1
+
+    def _render(self, history, fold_upto, summary):
+        recent = format_turns(history[fold_upto:], fold_upto)
+        if not fold_upto:
+            return recent
+        summary = summary or "(earlier conversation omitted)"
+        budget_chars = max(0, (self.token_budget - estimate_tokens(recent)) * 4)
+        if len(summary) > budget_chars:
+            summary = summary[:budget_chars].rsplit(" ", 1)[0] + " ..."
+        text = f"Summary of Q1-Q{fold_upto}: {summary}"
+        return f"{text}\n{recent}" if recent else text
+
+    def compact(self, history, summarize):
+        """
+        Return history formatted for the prompt within the token budget.
+
+        Args:
+            history (list): [{"question": ..., "answer": ...}, ...]
+            summarize (callable): summarize(previous_summary, turns_text) -> str;
+                may raise, in which case the folded turns are omitted
+        """
+        history = history or []
+        plan = self._plan(history)
+        if plan is None:
+            return format_turns(history)
+        fold_upto, keys = plan
+        if not fold_upto:
+            return self._render(history, 0, "")
+
+        base, summary = self._cached_base(keys, fold_upto)
+        if base < fold_upto:
+            try:
+                summary = summarize(summary, format_turns(history[base:fold_upto], base))
+            except Exception:
+                summary = ""
+            else:
+                self._store(keys, fold_upto, summary)
+        return self._render(history, fold_upto, summary)
+
+    async def compact_async(self, history, summarize):
+        """Async version of compact; summarize returns a coroutine."""
+        history = history or []
+        plan = self._plan(history)
+        if plan is None:
+            return format_turns(history)
+        fold_upto, keys = plan
+        if not fold_upto:
+            return self._render(history, 0, "")
+
+        base, summary = self._cached_base(keys, fold_upto)
+        if base < fold_upto:
+            try:
+                summary = await summarize(summary, format_turns(history[base:fold_upto], base))
+            except Exception:
+                summary = ""
+            else:
+                self._store(keys, fold_upto, summary)
+        return self._render(history, fold_upto, summary)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "cached_summaries": len(self._summaries),
+                "summaries_built": self.summaries_built,
+                "summary_hits": self.summary_hits,
+            }
@@ -0,0 +1,199 @@
+"""
+Background preload jobs.
+
+POST /preload enqueues an extraction and returns a job ID at once; a fixed
+pool of asyncio workers drains a bounded queue. Jobs are deduplicated: a video
+that is already cached gets an already-finished job, and a video that is
+already queued or running returns the existing job instead of a second
+extraction. Clients poll a job or subscribe to its status changes.
+"""
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import copy_context
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFull(Exception):
+    """The preload queue is at capacity."""
+
+
+class Job:
+    """One preload request and its status; status changes wake subscribers."""
+
+    def __init__(self, video_id, url, context=None):
+        self.id = uuid.uuid4().hex
+        self.video_id = video_id
+        self.url = url
+        self.status = QUEUED
+        self.error = None
+        self.cached = False
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._context = context
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    def changed(self):
+        """Event set on the next status change (take it before reading the status)."""
+        return self._changed
+
+    def _set(self, status, error=None):
+        self.status = status
+        self.error = error
+        now = time.time()
+        if status == RUNNING:
+            self.started_at = now
+        elif status in (DONE, FAILED):
+            self.finished_at = now
+            self._context = None
+        previous, self._changed = self._changed, asyncio.Event()
+        previous.set()
+
+    def to_dict(self):
+        def ms(start, end):
+            return round((end - start) * 1000, 1) if start is not None and end is not None else None
+
+        return {
+            "job_id": self.id,
+            "video_id": self.video_id,
+            "url": self.url,
+            "status": self.status,
+            "error": self.error,
+            "cached": self.cached,
+            "queued_ms": ms(self.created_at, self.started_at or self.finished_at or time.time()),
+            "run_ms": ms(self.started_at, self.finished_at or (time.time() if self.started_at else None)),
+        }
+
+
+class PreloadQueue:
+    """
+    Bounded queue of preload jobs processed by a fixed number of workers.
+
+    Args:
+        runner (callable): async runner(url) that extracts the video; raises on failure
+        is_cached (callable): is_cached(url) -> whether the video is already extracted
+        workers (int): Extractions run at once
+        max_queued (int): Jobs waiting at most; submit raises QueueFull beyond that
+        job_ttl (float): Seconds finished jobs stay available for polling
+        max_jobs (int): Finished jobs kept at most, oldest dropped first
+    """
+
+    def __init__(self, runner, is_cached, workers=4, max_queued=256, job_ttl=3600, max_jobs=10000):
+        self._runner = runner
+        self._is_cached = is_cached
+        self.workers = workers
+        self.max_queued = max_queued
+        self.job_ttl = job_ttl
+        self.max_jobs = max_jobs
+        self._queue = None
+        self._tasks = []
+        self._jobs = OrderedDict()
+        self._active = {}
+        self.running = 0
+        self.submitted = 0
+        self.deduplicated = 0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the workers on the running loop (no-op if already started)."""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Cancel the workers; running jobs are marked failed."""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _prune(self):
+        """Drop finished jobs past job_ttl, and the oldest finished ones beyond max_jobs."""
+        cutoff = time.time() - self.job_ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and (job.finished_at < cutoff or len(self._jobs) > self.max_jobs):
+                del self._jobs[job_id]
+
+    def submit(self, video_id, url):
+        """
+        Enqueue a preload of url, or return the job that already covers it.
+
+        Returns:
+            tuple: (job, deduplicated)
+
+        Raises:
+            QueueFull: If max_queued jobs are already waiting
+        """
+        self.start()
+        self._prune()
+        active = self._active.get(video_id)
+        if active is not None:
+            self.deduplicated += 1
+            return active, True
+
+        if self._is_cached(url):
+            job = Job(video_id, url)
+            job.cached = True
+            job._set(DONE)
+            self._jobs[job.id] = job
+            self.deduplicated += 1
+            return job, True
+
+        # The worker runs the extraction in the submitter's context (API key)
+        job = Job(video_id, url, copy_context())
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull(f"Preload queue is full ({self.max_queued} jobs waiting)") from None
+        self._jobs[job.id] = job
+        self._active[video_id] = job
+        self.submitted += 1
+        return job, False
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self.running += 1
+            try:
+                job._set(RUNNING)
+                await asyncio.create_task(self._runner(job.url), context=job._context)
+            except asyncio.CancelledError:
+                job._set(FAILED, "Preload cancelled")
+                self.failed += 1
+                raise
+            except Exception as e:
+                job._set(FAILED, str(e))
+                self.failed += 1
+            else:
+                job._set(DONE)
+                self.completed += 1
+            finally:
+                self.running -= 1
+                self._active.pop(job.video_id, None)
+                self._queue.task_done()
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self.running,
+            "workers": len(self._tasks),
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
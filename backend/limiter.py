@@ -0,0 +1,110 @@
+"""
+Fair concurrency limiting across API keys.
+
+A FairLimiter hands out a fixed number of slots. Waiters queue per key and
+freed slots go to the keys round-robin, so one client submitting a long batch
+can't starve another that asks for a single video: each waiting key gets a
+turn before any key gets a second one. An optional per-key cap bounds how
+many slots a single key holds at once.
+"""
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+
+class FairLimiter:
+    """
+    Async limiter with round-robin fairness between keys.
+
+    Args:
+        limit (int): Slots held at once across all keys
+        per_key (int): Slots one key may hold at once (None = no cap beyond limit)
+    """
+
+    def __init__(self, limit, per_key=None):
+        self.limit = max(1, limit)
+        self.per_key = per_key
+        self._active = 0
+        self._by_key = {}
+        # key -> deque of waiting futures; a key moves to the back after each grant
+        self._waiting = OrderedDict()
+        self.granted = 0
+        self.waited = 0
+
+    def _has_room(self, key):
+        if self._active >= self.limit:
+            return False
+        return self.per_key is None or self._by_key.get(key, 0) < self.per_key
+
+    def _take(self, key):
+        self._active += 1
+        self._by_key[key] = self._by_key.get(key, 0) + 1
+        self.granted += 1
+
+    def _release(self, key):
+        self._active -= 1
+        held = self._by_key[key] - 1
+        if held:
+            self._by_key[key] = held
+        else:
+            del self._by_key[key]
+        self._grant()
+
+    def _grant(self):
+        """Hand free slots to waiting keys, one per key per round."""
+        progress = True
+        while progress and self._active < self.limit and self._waiting:
+            progress = False
+            for key in list(self._waiting):
+                if not self._has_room(key):
+                    continue
+                waiters = self._waiting.pop(key)
+                while waiters and waiters[0].done():
+                    waiters.popleft()  # cancelled while waiting
+                if not waiters:
+                    continue
+                self._take(key)
+                waiters.popleft().set_result(None)
+                if waiters:
+                    self._waiting[key] = waiters
+                progress = True
+                if self._active >= self.limit:
+                    break
+
+    @asynccontextmanager
+    async def slot(self, key):
+        """Hold one slot for key while the block runs."""
+        if key not in self._waiting and self._has_room(key):
+            self._take(key)
+        else:
+            self.waited += 1
+            future = asyncio.get_running_loop().create_future()
+            self._waiting.setdefault(key, deque()).append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Granted just as we were cancelled: pass the slot on
+                    self._release(key)
+                else:
+                    future.cancel()
+                    waiters = self._waiting.get(key)
+                    if waiters is not None and future in waiters:
+                        waiters.remove(future)
+                        if not waiters:
+                            del self._waiting[key]
+                raise
+        try:
+            yield
+        finally:
+            self._release(key)
+
+    def stats(self):
+        return {
+            "active": self._active,
+            "limit": self.limit,
+            "waiting": sum(len(waiters) for waiters in self._waiting.values()),
+            "keys_waiting": len(self._waiting),
+            "granted": self.granted,
+            "waited": self.waited,
+        }
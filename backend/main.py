@@ -1,24 +1,123 @@
 # Updated Fast API Main with Merged Video Assistant
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 # from transcript import get_transcript
-from model import summarize_transcript, generate_quiz, ask_question_about_video, preload_video_content, _extract_video_content
+from contextlib import AsyncExitStack, aclosing, asynccontextmanager
+from model import is_video_cached, warm_up, get_video_memory, SERVER_TIMING_ENABLED, STARTUP_WARMUP
+from model import PRELOAD_WORKERS, PRELOAD_QUEUE_SIZE, PRELOAD_JOB_TTL
+from model import BATCH_MAX_URLS, BATCH_CONCURRENCY, BATCH_PER_KEY_CONCURRENCY
+from model import admission as _admission  # shared with background work started in model.py
+from model import summarize_transcript_async, generate_quiz_async, ask_question_about_video_async, _extract_video_content_async
+from model import summarize_transcript_stream, ask_question_about_video_stream
 from pydantic import BaseModel
+import asyncio
 import json
+import time
 from fastapi import Request
-from model import current_api_key  # ContextVar defined in model.py
+from model import current_api_key, bypass_output_cache  # ContextVars defined in model.py
+import metrics
+from admission import Overloaded, BACKGROUND, INTERACTIVE, STANDARD
+from jobs import PreloadQueue, QueueFull
+from limiter import FairLimiter
+from urls import InvalidVideoURL, canonicalize
 
 
-app = FastAPI()
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # In production, specify allowed origins
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+# Priority class of each endpoint that calls the model directly
+_ROUTE_CLASSES = {
+    "/chat": INTERACTIVE,
+    "/chat/stream": INTERACTIVE,
+    "/summarize": STANDARD,
+    "/summarize/stream": STANDARD,
+    "/quiz": STANDARD,
+    "/transcript": STANDARD,
+    "/complete-analysis": STANDARD,
+}
+
+
+def _overloaded_response(e: Overloaded):
+    return JSONResponse({"detail": str(e)}, status_code=429, headers={"Retry-After": str(e.retry_after)})
+
+
+async def _run_preload(url):
+    """Preload job body: extract url into the cache, raising if the extraction failed."""
+    async with _admission.admit(BACKGROUND):
+        content = await _extract_video_content_async(url)
+    if not content or content.startswith("Error"):
+        raise RuntimeError(content or "Failed to preload video content")
+
+
+_preload_queue = PreloadQueue(
+    _run_preload,
+    is_video_cached,
+    workers=PRELOAD_WORKERS,
+    max_queued=PRELOAD_QUEUE_SIZE,
+    job_ttl=PRELOAD_JOB_TTL,
 )
 
+
+def _collect_preload_metrics():
+    stats = _preload_queue.stats()
+    Sample = metrics.Sample
+    return [
+        Sample("smarted_preload_jobs_queued", "gauge", "Preload jobs waiting for a worker.", stats["queued"]),
+        Sample("smarted_preload_jobs_running", "gauge", "Preload jobs being extracted.", stats["running"]),
+        Sample("smarted_preload_jobs_submitted_total", "counter", "Preload jobs enqueued.", stats["submitted"]),
+        Sample("smarted_preload_jobs_deduplicated_total", "counter", "Preloads answered by a cached video or an existing job.", stats["deduplicated"]),
+        Sample("smarted_preload_jobs_completed_total", "counter", "Preload jobs that finished successfully.", stats["completed"]),
+        Sample("smarted_preload_jobs_failed_total", "counter", "Preload jobs that failed.", stats["failed"]),
+    ]
+
+
+def _collect_admission_metrics():
+    stats = _admission.stats()
+    Sample = metrics.Sample
+    samples = []
+    for name, cls in stats["classes"].items():
+        labels = {"class": name}
+        samples += [
+            Sample("smarted_admission_active", "gauge", "Admitted requests holding a slot.", cls["active"], labels),
+            Sample("smarted_admission_waiting", "gauge", "Requests waiting for a slot.", cls["waiting"], labels),
+            Sample("smarted_admission_admitted_total", "counter", "Requests admitted.", cls["admitted"], labels),
+            Sample("smarted_admission_rejected_total", "counter", "Requests refused with 429.", cls["rejected"], labels),
+        ]
+    return samples
+
+
+def _collect_batch_metrics():
+    stats = _batch_limiter.stats()
+    Sample = metrics.Sample
+    return [
+        Sample("smarted_batch_videos_active", "gauge", "Batch videos being analyzed.", stats["active"]),
+        Sample("smarted_batch_videos_waiting", "gauge", "Batch videos waiting for a slot.", stats["waiting"]),
+        Sample("smarted_batch_keys_waiting", "gauge", "API keys with batch videos waiting.", stats["keys_waiting"]),
+    ]
+
+
+metrics.REGISTRY.add_collector(_collect_preload_metrics)
+metrics.REGISTRY.add_collector(_collect_batch_metrics)
+metrics.REGISTRY.add_collector(_collect_admission_metrics)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the shared extraction store and SDK clients while (or before) serving;
+    # with STARTUP_WARMUP=0 they are initialized by the first requests instead
+    warming = None
+    if STARTUP_WARMUP == "background":
+        warming = asyncio.create_task(run_in_threadpool(warm_up))
+    elif STARTUP_WARMUP != "0":
+        await run_in_threadpool(warm_up)
+    _preload_queue.start()
+    yield
+    await _preload_queue.stop()
+    if warming is not None:
+        await warming
+
+
+app = FastAPI(lifespan=lifespan)
+
 class VideoURL(BaseModel):
     url: str
    
@@ -29,40 +128,178 @@ class SummarizeRequest(BaseModel):
 class QuizRequest(BaseModel):
     url: str
     num_questions: int = 5
+    previous_questions: list = []
 
 class ChatRequest(BaseModel):
     url: str
     question: str
     history: list = []
 
+class CompleteAnalysisRequest(BaseModel):
+    url: str
+    max_length: int = 800
+    num_questions: int = 6
+
+class BatchRequest(BaseModel):
+    urls: list
+    outputs: list = ["summary", "quiz"]
+    max_length: int = 800
+    num_questions: int = 6
+
 @app.middleware("http")
 async def attach_api_key(request: Request, call_next):
     """
     Pull 'X-API-Key' from the request headers and set it in the request-scoped ContextVar.
-    Ensures all model.py functions in this request see the right key via get_client().
+    Ensures all model.py functions in this request see the right key via the LLM backend.
+
+    'Cache-Control: no-cache' (or no-store) likewise asks for a freshly generated
+    summary/quiz instead of a cached one.
     """
     token = None
+    bypass_token = None
     try:
         api_key = request.headers.get("X-API-Key")
         if api_key:
             token = current_api_key.set(api_key)
+        cache_control = request.headers.get("Cache-Control", "").lower()
+        if "no-cache" in cache_control or "no-store" in cache_control:
+            bypass_token = bypass_output_cache.set(True)
         response = await call_next(request)
         return response
     finally:
-        # Clean up the ContextVar so it doesn't leak across requests
+        # Clean up the ContextVars so they don't leak across requests
         if token is not None:
             current_api_key.reset(token)
+        if bypass_token is not None:
+            bypass_output_cache.reset(bypass_token)
+
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """
+    Admit model-calling requests by priority class (see _ROUTE_CLASSES).
+    Over the per-key limit, with the class queue full, or after waiting
+    ADMISSION_MAX_WAIT, answer 429 with Retry-After instead of queueing.
+    Streamed responses hold their slot until the last chunk.
+    """
+    name = _ROUTE_CLASSES.get(request.url.path)
+    if name is None or request.method == "OPTIONS":
+        return await call_next(request)
+
+    key = request.headers.get("X-API-Key") or (request.client.host if request.client else None)
+    slot = AsyncExitStack()
+    try:
+        await slot.enter_async_context(_admission.admit(name, key))
+    except Overloaded as e:
+        return _overloaded_response(e)
+
+    try:
+        response = await call_next(request)
+    except BaseException:
+        await slot.aclose()
+        raise
+
+    body = response.body_iterator
+
+    async def admitted_body():
+        try:
+            async with aclosing(body):
+                async for chunk in body:
+                    yield chunk
+        finally:
+            await slot.aclose()
+
+    response.body_iterator = admitted_body()
+    return response
+
+
+def _metrics_path(request: Request):
+    """Route path used as a metrics label; unknown paths share one label to bound cardinality."""
+    path = request.url.path
+    if path in _ROUTE_PATHS:
+        return path
+    # Templated routes (e.g. /preload/{job_id}) are labelled by their template
+    for route in app.routes:
+        regex = getattr(route, "path_regex", None)
+        if regex is not None and "{" in route.path and regex.match(path):
+            return route.path
+    return "other"
+
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    """
+    Time every request and count it by route and status, and collect the
+    per-stage timings model.py records for it (sent as a Server-Timing header
+    when SERVER_TIMING_ENABLED). Streamed bodies are timed until their last
+    chunk; their Server-Timing header only covers the work done before the
+    first byte.
+    """
+    path = _metrics_path(request)
+    started = time.perf_counter()
+    timing_token, timings = metrics.begin_request()
+    metrics.HTTP_IN_FLIGHT.inc(path=path)
+    try:
+        response = await call_next(request)
+    except BaseException:
+        metrics.HTTP_IN_FLIGHT.dec(path=path)
+        metrics.HTTP_REQUESTS.inc(method=request.method, path=path, status=500)
+        raise
+    finally:
+        metrics.end_request(timing_token)
+
+    if SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = metrics.server_timing(timings, time.perf_counter() - started)
+
+    body = response.body_iterator
+
+    async def observed_body():
+        try:
+            async with aclosing(body):
+                async for chunk in body:
+                    yield chunk
+        finally:
+            metrics.HTTP_IN_FLIGHT.dec(path=path)
+            metrics.HTTP_DURATION.observe(time.perf_counter() - started, method=request.method, path=path)
+            metrics.HTTP_REQUESTS.inc(method=request.method, path=path, status=response.status_code)
+
+    response.body_iterator = observed_body()
+    return response
+
+
+# Configure CORS. Added after the @app.middleware functions so it is the
+# outermost layer: preflights are answered before admission control, and
+# 429s from admission still carry the CORS headers the browser needs
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # In production, specify allowed origins
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
 
 
 
+def _canonical_url(url):
+    """
+    Canonical watch URL for url, so every variant of a video shares its caches.
+    Invalid URLs are rejected with a 400 before any model call is made.
+    """
+    try:
+        return canonicalize(url)[1]
+    except InvalidVideoURL as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.get("/")
 def read_root():
     return {"status": "online", "service": "SmartEd API"}
 
 @app.post("/transcript")
-def get_transcript_endpoint(video: VideoURL):
+async def get_transcript_endpoint(video: VideoURL):
+    url = _canonical_url(video.url)
     try:
-        transcript = _extract_video_content(video.url)
+        transcript = await _extract_video_content_async(url)
         if not transcript or transcript.startswith("Error") or transcript == "Invalid YouTube URL":
             raise HTTPException(status_code=400, detail=transcript or "Failed to get transcript")
         return {"transcript": transcript}
@@ -70,9 +307,10 @@ def get_transcript_endpoint(video: VideoURL):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/summarize")
-def summarize_endpoint(request: SummarizeRequest):
+async def summarize_endpoint(request: SummarizeRequest):
+    url = _canonical_url(request.url)
     try:
-        summary = summarize_transcript(request.url, max_length=request.max_length)
+        summary = await summarize_transcript_async(url, max_length=request.max_length)
         
         if summary.startswith("Error"):
             raise HTTPException(status_code=400, detail=summary)
@@ -83,27 +321,37 @@ def summarize_endpoint(request: SummarizeRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _quiz_error(quiz_result):
+    """Return the error message carried by a quiz result, or None."""
+    if isinstance(quiz_result, str) and quiz_result.startswith("Error"):
+        return quiz_result
+    # Handle different response formats - could be JSON string or dict with error
+    if isinstance(quiz_result, dict) and "error" in quiz_result:
+        return quiz_result["error"]
+    return None
+
+def _parse_quiz(quiz_result):
+    """If quiz_result is a string (JSON), parse it; if not valid JSON, return as is."""
+    if isinstance(quiz_result, str):
+        try:
+            return json.loads(quiz_result)
+        except json.JSONDecodeError:
+            pass
+    return quiz_result
+
 @app.post("/quiz")
-def quiz_endpoint(request: QuizRequest):
+async def quiz_endpoint(request: QuizRequest):
+    url = _canonical_url(request.url)
     try:
-        quiz_result = generate_quiz(request.url, num_questions=request.num_questions)
-        
-        if isinstance(quiz_result, str) and quiz_result.startswith("Error"):
-            raise HTTPException(status_code=400, detail=quiz_result)
+        quiz_result = await generate_quiz_async(
+            url, num_questions=request.num_questions, previous_questions=request.previous_questions
+        )
         
-        # Handle different response formats - could be JSON string or dict with error
-        if isinstance(quiz_result, dict) and "error" in quiz_result:
-            raise HTTPException(status_code=400, detail=quiz_result["error"])
-        
-        # If quiz_result is a string (JSON), parse it
-        if isinstance(quiz_result, str):
-            try:
-                quiz_result = json.loads(quiz_result)
-            except json.JSONDecodeError:
-                # If not valid JSON, return as is
-                pass
+        quiz_error = _quiz_error(quiz_result)
+        if quiz_error:
+            raise HTTPException(status_code=400, detail=quiz_error)
                 
-        return {"quiz": quiz_result}
+        return {"quiz": _parse_quiz(quiz_result)}
     except HTTPException:
         raise
     except Exception as e:
@@ -118,72 +366,309 @@ async def chat_endpoint(request: Request):
         history = data.get("history", [])
         if not url or not question:
             raise HTTPException(status_code=400, detail="Missing url or question")
-        answer = ask_question_about_video(url, question, history)
+        answer = await ask_question_about_video_async(_canonical_url(url), question, history)
         return {"answer": answer}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def _sse(event, data):
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _sse_response(stream):
+    """
+    Relay (text, usage) chunks from a model stream as SSE: one `chunk` event per
+    piece of text, then a `done` event with timing and token usage (or `error`).
+
+    If the client disconnects, Starlette cancels this generator; the cancellation
+    propagates into the model stream and closes the upstream Gemini request.
+    """
+    async def events():
+        started = time.perf_counter()
+        first_token_ms = None
+        chunks = 0
+        usage = None
+        try:
+            async with aclosing(stream):
+                async for text, chunk_usage in stream:
+                    if chunk_usage:
+                        usage = chunk_usage
+                    if not text:
+                        continue
+                    if first_token_ms is None:
+                        first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                    chunks += 1
+                    yield _sse("chunk", {"text": text})
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+            return
+        yield _sse("done", {
+            "ttft_ms": first_token_ms,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+            "chunks": chunks,
+            "usage": usage,
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/summarize/stream")
+async def summarize_stream_endpoint(request: SummarizeRequest):
+    """Stream the summary over Server-Sent Events as it is generated."""
+    url = _canonical_url(request.url)
+    return _sse_response(summarize_transcript_stream(url, max_length=request.max_length))
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """Stream the chat answer over Server-Sent Events as it is generated."""
+    if not request.url or not request.question:
+        raise HTTPException(status_code=400, detail="Missing url or question")
+    url = _canonical_url(request.url)
+    return _sse_response(ask_question_about_video_stream(url, request.question, request.history))
+
+async def _timed(timings, name, coro):
+    """Await coro, recording its wall time in timings[name] (ms), even on failure."""
+    started = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+async def _analyze_video(url, max_length, num_questions, outputs=("summary", "quiz"), timings=None):
+    """
+    Extract the video once, then generate the requested outputs concurrently.
+
+    If only one output fails, the other is still returned with "partial": true
+    and the failure listed under "errors".
+
+    Raises:
+        HTTPException: 400 if the extraction fails or every requested output fails
+    """
+    started = time.perf_counter()
+    timings = {} if timings is None else timings
+    # Shared extraction; both branches below read it from the cache
+    video_content = await _timed(timings, "extraction", _extract_video_content_async(url))
+
+    if video_content.startswith("Error"):
+        raise HTTPException(status_code=400, detail=video_content)
+
+    summary = quiz_result = None
+    branches = {}
+    if "summary" in outputs:
+        branches["summary"] = _timed(timings, "summary", summarize_transcript_async(url, max_length=max_length))
+    if "quiz" in outputs:
+        branches["quiz"] = _timed(timings, "quiz", generate_quiz_async(url, num_questions=num_questions))
+    results = dict(zip(branches, await asyncio.gather(*branches.values(), return_exceptions=True)))
+
+    errors = {}
+    if "summary" in results:
+        summary = results["summary"]
+        if isinstance(summary, Exception):
+            errors["summary"] = str(summary)
+            summary = None
+        elif summary.startswith("Error"):
+            errors["summary"] = summary
+            summary = None
+
+    if "quiz" in results:
+        quiz_result = results["quiz"]
+        if isinstance(quiz_result, Exception):
+            errors["quiz"] = str(quiz_result)
+            quiz_result = None
+        else:
+            quiz_error = _quiz_error(quiz_result)
+            if quiz_error:
+                errors["quiz"] = quiz_error
+                quiz_result = None
+            else:
+                quiz_result = _parse_quiz(quiz_result)
+
+    if results and len(errors) == len(results):
+        raise HTTPException(status_code=400, detail="; ".join(errors.values()))
+
+    timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+    return {
+        "summary": summary,
+        "quiz": quiz_result,
+        "partial": bool(errors),
+        "errors": errors,
+        "timings_ms": timings,
+        "cached": True  # Indicates content is now cached for fast subsequent calls
+    }
+
 @app.post("/complete-analysis")
-def complete_analysis_endpoint(request: Request):
-    """Pre-loads video content and gets summary and quiz in one request"""
+async def complete_analysis_endpoint(request: CompleteAnalysisRequest):
+    """
+    Extracts the video once, then generates summary and quiz concurrently.
+
+    If only one branch fails, the other is still returned with "partial": true
+    and the failure listed under "errors".
+    """
+    url = _canonical_url(request.url)
     try:
-        # Pre-extract video content to cache it for faster subsequent calls
-        video_content = _extract_video_content(request.url)
-        
-        if video_content.startswith("Error"):
-            raise HTTPException(status_code=400, detail=video_content)
-       
-        # Now get summary and quiz (these will use cached content)
-        summary = summarize_transcript(request.url)
-        
-        if summary.startswith("Error"):
-            raise HTTPException(status_code=400, detail=summary)
-       
-        quiz_result = generate_quiz(request.url)
-        
-        if isinstance(quiz_result, str) and quiz_result.startswith("Error"):
-            raise HTTPException(status_code=400, detail=quiz_result)
-        
-        # Handle different response formats - could be JSON string or dict with error
-        if isinstance(quiz_result, dict) and "error" in quiz_result:
-            raise HTTPException(status_code=400, detail=quiz_result["error"])
-        
-        # If quiz_result is a string (JSON), parse it
-        if isinstance(quiz_result, str):
-            try:
-                quiz_result = json.loads(quiz_result)
-            except json.JSONDecodeError:
-                # If not valid JSON, return as is
-                pass
-                
-        return {
-            "summary": summary,
-            "quiz": quiz_result,
-            "cached": True  # Indicates content is now cached for fast subsequent calls
-        }
+        return await _analyze_video(url, request.max_length, request.num_questions)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/preload")
-def preload_endpoint(video: VideoURL):
-    """Preload video content for faster subsequent operations"""
+# Videos analyzed at once by /batch, shared fairly between API keys
+_batch_limiter = FairLimiter(BATCH_CONCURRENCY, per_key=BATCH_PER_KEY_CONCURRENCY)
+
+_BATCH_OUTPUTS = ("summary", "quiz")
+
+async def _batch_item(index, raw_url, request):
+    """Analyze one batch entry; failures become an error result instead of ending the batch."""
+    result = {"index": index, "url": raw_url}
+    timings = {}
+    started = time.perf_counter()
     try:
-        success = preload_video_content(video.url)
-        
-        if not success:
-            raise HTTPException(status_code=400, detail="Failed to preload video content")
-            
-        return {
-            "message": "Video content preloaded successfully",
-            "url": video.url,
-            "cached": True
-        }
-    except HTTPException:
-        raise
+        url = _canonical_url(raw_url)
+        result["video_id"] = canonicalize(url)[0]
+        async with _batch_limiter.slot(current_api_key.get() or ""), _admission.admit(BACKGROUND):
+            timings["queue"] = round((time.perf_counter() - started) * 1000, 1)
+            analysis = await _analyze_video(
+                url, request.max_length, request.num_questions, request.outputs, timings=timings
+            )
+        result.update(analysis, status="ok")
+    except HTTPException as e:
+        result.update(status="error", error=e.detail, timings_ms=timings)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        result.update(status="error", error=str(e), timings_ms=timings)
+    return result
+
+@app.post("/batch")
+async def batch_endpoint(request: BatchRequest):
+    """
+    Analyze several videos, streaming a `result` event per video as each one
+    completes (in completion order, tagged with its index in `urls`), then a
+    `done` event with counts.
+
+    `outputs` picks any of "summary" and "quiz"; an empty list only extracts
+    (like /preload). Videos run BATCH_CONCURRENCY at a time across all batches,
+    with one API key holding at most BATCH_PER_KEY_CONCURRENCY of those and
+    waiting keys served round-robin. Duplicate and equivalent URLs share one
+    extraction through the caches.
+    """
+    if not request.urls:
+        raise HTTPException(status_code=400, detail="No URLs given")
+    if len(request.urls) > BATCH_MAX_URLS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_URLS} URLs per batch")
+    unknown = [output for output in request.outputs if output not in _BATCH_OUTPUTS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown outputs: {', '.join(map(str, unknown))}")
+    try:
+        _admission.check(BACKGROUND)
+    except Overloaded as e:
+        return _overloaded_response(e)
+
+    async def events():
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(_batch_item(i, url, request)) for i, url in enumerate(request.urls)]
+        succeeded = 0
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                succeeded += result["status"] == "ok"
+                yield _sse("result", result)
+        finally:
+            # Client went away: stop the videos still waiting or running
+            for task in tasks:
+                task.cancel()
+        yield _sse("done", {
+            "total": len(tasks),
+            "succeeded": succeeded,
+            "failed": len(tasks) - succeeded,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus metrics: request/stage latency, model calls and tokens, cache and extraction counters."""
+    return Response(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/cache/videos")
+def cache_videos_endpoint():
+    """Memory held per cached video (extraction plus derived outputs), largest first."""
+    videos = get_video_memory()
+    return {
+        "videos": videos,
+        "total_bytes": sum(video["bytes"] for video in videos),
+        "total_raw_bytes": sum(video["raw_bytes"] for video in videos),
+    }
+
+@app.post("/preload", status_code=202)
+async def preload_endpoint(video: VideoURL):
+    """
+    Queue a background extraction so later calls on the video hit the cache.
+
+    Returns at once with a job ID to poll (GET /preload/{job_id}) or follow
+    (GET /preload/{job_id}/events). A video that is already cached, queued or
+    being extracted returns the job that covers it instead of a new one.
+    """
+    url = _canonical_url(video.url)
+    try:
+        job, deduplicated = _preload_queue.submit(canonicalize(url)[0], url)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(_admission.retry_after(BACKGROUND))})
+    return {
+        **job.to_dict(),
+        "deduplicated": deduplicated,
+        "message": "Video content already cached" if job.cached else "Video preload queued",
+    }
+
+def _get_preload_job(job_id):
+    job = _preload_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired preload job")
+    return job
+
+@app.get("/preload/{job_id}")
+def preload_status_endpoint(job_id: str):
+    """Current status of a preload job: queued, running, done or failed."""
+    return _get_preload_job(job_id).to_dict()
+
+@app.get("/preload/{job_id}/events")
+async def preload_events_endpoint(job_id: str):
+    """
+    Follow a preload job over Server-Sent Events: one `status` event now and one
+    per status change, ending after the job is done or failed. A comment line
+    is sent every 15 s so proxies keep the connection open.
+    """
+    job = _get_preload_job(job_id)
+
+    async def events():
+        while True:
+            changed = job.changed()
+            yield _sse("status", job.to_dict())
+            if job.finished:
+                return
+            while not changed.is_set():
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Paths reported as-is in metrics labels (anything else is "other")
+_ROUTE_PATHS = {route.path for route in app.routes}
 
 # if __name__ == "__main__":      
 #     import uvicorn
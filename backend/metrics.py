@@ -0,0 +1,314 @@
+"""
+Minimal Prometheus-style instrumentation for the API.
+
+Counters, gauges and histograms live in one process-wide registry that
+/metrics renders in the Prometheus text format; modules that already keep
+their own counters (video cache, single-flight, chat history) export them
+through collector callbacks instead of double counting.
+
+Hot-path code times named stages with ``stage()`` and model calls with
+``llm_call()``. Every observation is also appended to the current request's
+timing list (a ContextVar set by the HTTP middleware), which main.py can
+return as a Server-Timing header.
+"""
+import asyncio
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import NamedTuple, Optional
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Sample(NamedTuple):
+    """One value reported by a collector callback."""
+    name: str
+    kind: str  # "counter" or "gauge"
+    documentation: str
+    value: float
+    labels: Optional[dict] = None
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, **extra):
+        return {**dict(zip(self.labelnames, key)), **extra}
+
+    def samples(self):
+        """Yield (sample name, labels, value) for rendering."""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, self._labels(key), value
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that goes up and down (e.g. requests in flight)."""
+
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed upper-bound buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, (None, 0.0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total)) for key, (counts, total) in self._values.items()]
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", self._labels(key, le=_format_value(bound)), cumulative
+            yield f"{self.name}_sum", self._labels(key), total
+            yield f"{self.name}_count", self._labels(key), cumulative
+
+
+class Registry:
+    """Holds metrics and collector callbacks; render() produces the /metrics body."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """Register collect() -> iterable of Sample, called on every scrape."""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        seen = set()
+        for collect in collectors:
+            for sample in collect():
+                if sample.name not in seen:
+                    seen.add(sample.name)
+                    lines.append(f"# HELP {sample.name} {sample.documentation}")
+                    lines.append(f"# TYPE {sample.name} {sample.kind}")
+                lines.append(f"{sample.name}{_format_labels(sample.labels)} {_format_value(sample.value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "smarted_http_requests_total", "HTTP requests served.", ("method", "path", "status")))
+HTTP_DURATION = REGISTRY.register(Histogram(
+    "smarted_http_request_duration_seconds", "HTTP request duration, including streamed bodies.", ("method", "path")))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "smarted_http_requests_in_flight", "HTTP requests being served.", ("path",)))
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "smarted_stage_duration_seconds", "Time spent in each processing stage.", ("stage",)))
+LLM_CALLS = REGISTRY.register(Counter(
+    "smarted_llm_calls_total", "Model calls by stage and outcome (ok, error, cancelled).", ("stage", "model", "outcome")))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "smarted_llm_tokens_total", "Tokens reported by the model, by direction (prompt, output).", ("stage", "model", "direction")))
+LLM_IN_FLIGHT = REGISTRY.register(Gauge(
+    "smarted_llm_calls_in_flight", "Model calls awaiting a response.", ("stage",)))
+LLM_TTFT = REGISTRY.register(Histogram(
+    "smarted_llm_time_to_first_token_seconds", "Time to the first streamed token.", ("stage",)))
+LLM_RETRIES = REGISTRY.register(Counter(
+    "smarted_llm_retries_total", "Model call retries, by the status (or \"network\") that caused them.", ("stage", "reason")))
+LLM_HEDGES = REGISTRY.register(Counter(
+    "smarted_llm_hedges_total", "Hedged duplicate requests sent for slow model calls.", ("stage",)))
+
+# Stage timings of the current request: list of (stage, seconds), or None outside a request
+_request_timings: ContextVar[Optional[list]] = ContextVar("request_timings", default=None)
+
+
+def begin_request():
+    """
+    Start collecting stage timings for the current context.
+
+    Returns:
+        tuple: (token for end_request, the timings list)
+    """
+    timings = []
+    return _request_timings.set(timings), timings
+
+
+def end_request(token):
+    _request_timings.reset(token)
+
+
+def observe_stage(stage, seconds):
+    """Record seconds spent in stage, globally and for the current request."""
+    STAGE_DURATION.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as stage `name` (recorded even if it raises)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+def queued(fn, *args, **kwargs):
+    """
+    Wrap fn(*args, **kwargs) for a thread pool, recording the delay between
+    this call and a worker thread picking it up as the threadpool_wait stage.
+    """
+    submitted = time.perf_counter()
+
+    def run():
+        observe_stage("threadpool_wait", time.perf_counter() - submitted)
+        return fn(*args, **kwargs)
+
+    return run
+
+
+class _LLMCall:
+    __slots__ = ("stage", "started", "usage", "first_token_seen")
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.started = time.perf_counter()
+        self.usage = None
+        self.first_token_seen = False
+
+    def first_token(self):
+        """Mark the first streamed token (only the first call counts)."""
+        if not self.first_token_seen:
+            self.first_token_seen = True
+            LLM_TTFT.observe(time.perf_counter() - self.started, stage=self.stage)
+
+
+@contextmanager
+def llm_call(stage_name, model):
+    """
+    Time one model call as stage `stage_name` and count it.
+
+    Set ``.usage`` on the yielded record to a usage dict (see backends.Generation)
+    to count its tokens; call ``.first_token()`` on streamed calls.
+    """
+    call = _LLMCall(stage_name)
+    outcome = "error"
+    LLM_IN_FLIGHT.inc(stage=stage_name)
+    try:
+        yield call
+        outcome = "ok"
+    except (GeneratorExit, asyncio.CancelledError):
+        outcome = "cancelled"
+        raise
+    finally:
+        LLM_IN_FLIGHT.dec(stage=stage_name)
+        observe_stage(stage_name, time.perf_counter() - call.started)
+        LLM_CALLS.inc(stage=stage_name, model=model, outcome=outcome)
+        if call.usage:
+            for direction in ("prompt", "output"):
+                tokens = call.usage.get(f"{direction}_tokens")
+                if tokens:
+                    LLM_TOKENS.inc(tokens, stage=stage_name, model=model, direction=direction)
+
+
+def server_timing(timings, total_seconds=None):
+    """
+    Format stage timings as a Server-Timing header value.
+
+    Repeated stages (e.g. several segment analyses) are summed, with their
+    count in the description.
+    """
+    totals = {}
+    counts = {}
+    for name, seconds in list(timings):
+        totals[name] = totals.get(name, 0.0) + seconds
+        counts[name] = counts.get(name, 0) + 1
+    parts = []
+    for name, seconds in totals.items():
+        desc = f';desc="x{counts[name]}"' if counts[name] > 1 else ""
+        parts.append(f"{name};dur={seconds * 1000:.1f}{desc}")
+    if total_seconds is not None:
+        parts.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(parts)
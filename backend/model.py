@@ -1,11 +1,37 @@
+import asyncio
+import hashlib
+import json
+import logging
 import os
-from openai import OpenAI
-from google import genai
-from google.genai import types
-
-from contextvars import ContextVar
+import sqlite3
+import threading
+import time
+from contextlib import aclosing
+
+from concurrent.futures import Future
+from contextvars import ContextVar, copy_context
+from functools import lru_cache
 from typing import Optional
 
+from cachetools import LRUCache
+
+import metrics
+from admission import AdmissionController, ClassLimits, BACKGROUND, INTERACTIVE, STANDARD
+from answercache import VideoAnswers
+from backends import FakeBackend, GeminiBackend, OpenAIBackend, VideoInput
+from cache import VideoCache
+from history import HistoryManager
+from quizbank import QuestionBank, parse_questions
+from resilience import RetryPolicy
+from retrieval import SectionIndex, select_context
+from singleflight import SingleFlight
+from summarytree import parse_summary_tree
+from segments import YouTubeDurationProbe, merge_segments, plan_segments
+from store import ExtractionStore
+from transcripts import TranscriptUnavailable, YouTubeTranscriptFetcher, format_transcript, is_usable
+from urls import canonicalize, video_id
+
+logger = logging.getLogger(__name__)
 
 
 # Use GOOGLE_API_KEY since that's what the library prefers
@@ -14,11 +40,157 @@ from typing import Optional
 # Request-scoped API key (set by middleware in main.py)
 current_api_key: ContextVar[Optional[str]] = ContextVar("current_api_key", default=None)
 
+# Request-scoped opt-out of the output cache (Cache-Control: no-cache, set by middleware in main.py)
+bypass_output_cache: ContextVar[bool] = ContextVar("bypass_output_cache", default=False)
+
 
 SUMMARY_MODEL = "gemini-2.0-flash"
 QUIZ_MODEL = "gemini-2.0-flash"
 CHAT_MODEL = "gemini-2.0-flash"
 
+# Video cache limits (override via environment)
+VIDEO_CACHE_MAX_BYTES = int(os.getenv("VIDEO_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+VIDEO_CACHE_TTL = float(os.getenv("VIDEO_CACHE_TTL", 24 * 60 * 60))
+VIDEO_CACHE_ERROR_TTL = float(os.getenv("VIDEO_CACHE_ERROR_TTL", 60))
+# Analyses and outputs at least this long are held zlib-compressed (0 = never);
+# the most recently read ones are also kept decompressed in a hot set
+VIDEO_CACHE_COMPRESS_MIN_BYTES = int(os.getenv("VIDEO_CACHE_COMPRESS_MIN_BYTES", 2048))
+VIDEO_CACHE_HOT_ENTRIES = int(os.getenv("VIDEO_CACHE_HOT_ENTRIES", 16))
+
+# Shared on-disk extraction store (set EXTRACTION_STORE_PATH="" to disable)
+EXTRACTION_STORE_PATH = os.getenv(
+    "EXTRACTION_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "smarted_store.sqlite3")
+)
+# The lease is renewed every third of this while the extraction runs, so it only
+# bounds how long other workers wait on a holder that died
+EXTRACTION_LEASE_SECONDS = float(os.getenv("EXTRACTION_LEASE_SECONDS", 300))
+WARM_START_ENTRIES = int(os.getenv("WARM_START_ENTRIES", 200))
+
+# Worker warm-up (see warm_up): "background" while the worker already serves,
+# "1" before it takes traffic, "0" never (everything initializes on first use)
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "background")
+
+# Transcript-first extraction: analyze captions as text when they are dense enough,
+# fall back to the full multimodal video analysis otherwise
+TRANSCRIPT_TIER_ENABLED = os.getenv("TRANSCRIPT_TIER_ENABLED", "1") != "0"
+TRANSCRIPT_MIN_WORDS = int(os.getenv("TRANSCRIPT_MIN_WORDS", 150))
+TRANSCRIPT_MIN_WORDS_PER_MINUTE = float(os.getenv("TRANSCRIPT_MIN_WORDS_PER_MINUTE", 40))
+
+# Long videos are analyzed as concurrent time segments and merged in order
+SEGMENTED_EXTRACTION_ENABLED = os.getenv("SEGMENTED_EXTRACTION_ENABLED", "1") != "0"
+LONG_VIDEO_SECONDS = int(os.getenv("LONG_VIDEO_SECONDS", 45 * 60))
+SEGMENT_SECONDS = int(os.getenv("SEGMENT_SECONDS", 20 * 60))
+SEGMENT_CONCURRENCY = int(os.getenv("SEGMENT_CONCURRENCY", 4))
+# Whole-segment retries on top of the per-call retries below (LLM_RETRY_*)
+SEGMENT_RETRIES = int(os.getenv("SEGMENT_RETRIES", 0))
+
+# Generated summaries and quizzes, cached per video, prompt version, model and parameters
+OUTPUT_CACHE_MAX_BYTES = int(os.getenv("OUTPUT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+OUTPUT_CACHE_TTL = float(os.getenv("OUTPUT_CACHE_TTL", 6 * 60 * 60))
+
+# Bump when a prompt changes so outputs generated from the old prompt stop being served
+SUMMARY_PROMPT_VERSION = 1
+SUMMARY_TREE_PROMPT_VERSION = 1
+QUIZ_PROMPT_VERSION = 1
+
+# Summary tree: one generation per video yields section summaries, ranked key points
+# and a top-level digest; summaries of max_length words in the tree's range are
+# assembled from it locally, other lengths are generated directly
+SUMMARY_TREE_ENABLED = os.getenv("SUMMARY_TREE_ENABLED", "1") != "0"
+SUMMARY_TREE_WORDS = int(os.getenv("SUMMARY_TREE_WORDS", 1500))
+SUMMARY_TREE_MIN_LENGTH = int(os.getenv("SUMMARY_TREE_MIN_LENGTH", 150))
+SUMMARY_TREE_MIN_FILL = float(os.getenv("SUMMARY_TREE_MIN_FILL", 0.6))
+
+# Quiz bank: one generation pass builds a batch of questions per video; /quiz serves
+# slices the user hasn't seen and adds a batch in the background when few are left
+QUIZ_BANK_ENABLED = os.getenv("QUIZ_BANK_ENABLED", "1") != "0"
+QUIZ_BANK_BATCH = int(os.getenv("QUIZ_BANK_BATCH", 20))
+QUIZ_BANK_MAX_QUESTIONS = int(os.getenv("QUIZ_BANK_MAX_QUESTIONS", 100))
+QUIZ_BANK_LOW_WATER = int(os.getenv("QUIZ_BANK_LOW_WATER", 5))
+QUIZ_SIMILARITY_THRESHOLD = float(os.getenv("QUIZ_SIMILARITY_THRESHOLD", 0.6))
+QUIZ_BANK_CACHE_SIZE = int(os.getenv("QUIZ_BANK_CACHE_SIZE", 256))
+
+# Chat retrieval: long analyses are indexed per video and only the sections
+# relevant to the question are sent (broad questions still get everything)
+CHAT_CONTEXT_TOP_K = int(os.getenv("CHAT_CONTEXT_TOP_K", 6))
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", 3000))
+SECTION_INDEX_CACHE_SIZE = int(os.getenv("SECTION_INDEX_CACHE_SIZE", 256))
+
+# Chat history: token budget, verbatim tail, and how many older turns are folded per summary
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", 1500))
+CHAT_HISTORY_KEEP_TURNS = int(os.getenv("CHAT_HISTORY_KEEP_TURNS", 4))
+CHAT_HISTORY_FOLD_TURNS = int(os.getenv("CHAT_HISTORY_FOLD_TURNS", 4))
+
+# Semantic answer cache: a history-free chat question this similar (cosine of
+# hashed n-gram vectors, 0-1) to an earlier one on the same video reuses its answer
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") != "0"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.9))
+ANSWER_CACHE_MAX_PER_VIDEO = int(os.getenv("ANSWER_CACHE_MAX_PER_VIDEO", 64))
+ANSWER_CACHE_VIDEOS = int(os.getenv("ANSWER_CACHE_VIDEOS", 256))
+
+# LLM backend: "gemini" (default), "openai" (any OpenAI-compatible endpoint, text only)
+# or "fake" (deterministic local stand-in for load tests and benchmarks)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+# Max distinct API keys whose clients (and their HTTP connection pools) are kept alive
+CLIENT_POOL_SIZE = int(os.getenv("CLIENT_POOL_SIZE", 256))
+
+# Background /preload jobs: extractions run at once, jobs allowed to wait, and
+# seconds a finished job stays available for polling
+PRELOAD_WORKERS = int(os.getenv("PRELOAD_WORKERS", 4))
+PRELOAD_QUEUE_SIZE = int(os.getenv("PRELOAD_QUEUE_SIZE", 256))
+PRELOAD_JOB_TTL = float(os.getenv("PRELOAD_JOB_TTL", 60 * 60))
+
+# POST /batch: URLs accepted per request, videos analyzed at once across all
+# batches, and how many of those one API key may hold
+BATCH_MAX_URLS = int(os.getenv("BATCH_MAX_URLS", 50))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+BATCH_PER_KEY_CONCURRENCY = int(os.getenv("BATCH_PER_KEY_CONCURRENCY", 4))
+
+# Admission control (see admission.py): slots across all classes, slots per
+# class (interactive = chat, standard = summary/quiz/transcript/complete
+# analysis, background = preload jobs, batch items and quiz bank top-ups),
+# requests one API key may have admitted or waiting, and how many HTTP requests
+# of a class may wait and for how long before getting a 429
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", 64))
+ADMISSION_INTERACTIVE_LIMIT = int(os.getenv("ADMISSION_INTERACTIVE_LIMIT", 64))
+ADMISSION_STANDARD_LIMIT = int(os.getenv("ADMISSION_STANDARD_LIMIT", 32))
+ADMISSION_BACKGROUND_LIMIT = int(os.getenv("ADMISSION_BACKGROUND_LIMIT", 12))
+ADMISSION_PER_KEY_LIMIT = int(os.getenv("ADMISSION_PER_KEY_LIMIT", 16))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", 128))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", 10))
+
+# Model work admitted by priority class; chat keeps headroom under any background burst
+admission = AdmissionController(
+    ADMISSION_MAX_CONCURRENCY,
+    {
+        INTERACTIVE: ClassLimits(0, ADMISSION_INTERACTIVE_LIMIT, ADMISSION_QUEUE_SIZE, ADMISSION_MAX_WAIT),
+        STANDARD: ClassLimits(1, ADMISSION_STANDARD_LIMIT, ADMISSION_QUEUE_SIZE, ADMISSION_MAX_WAIT),
+        # Background work waits in its own bounded queues (preload jobs, batch slots, quiz refills)
+        BACKGROUND: ClassLimits(2, ADMISSION_BACKGROUND_LIMIT, ADMISSION_QUEUE_SIZE),
+    },
+    per_key_limit=ADMISSION_PER_KEY_LIMIT,
+)
+
+# Model call resilience: attempts per call (1 = no retries), backoff for the
+# first retry (doubling up to the max, with full jitter), and a deadline for
+# all attempts of one call. Server retry hints (Retry-After) override the backoff.
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", 3))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", 1.0))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", 20.0))
+LLM_CALL_DEADLINE = float(os.getenv("LLM_CALL_DEADLINE", 600))
+
+# Hedging: an async text call slower than this percentile of its stage's recent
+# latency gets a duplicate request; the first answer wins (0 = disabled)
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 0))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+LLM_HEDGE_STAGES = [
+    s.strip() for s in os.getenv("LLM_HEDGE_STAGES", "summary,summary_tree,quiz,quiz_bank,chat,history_summary").split(",") if s.strip()
+]
+
+# Return per-stage timings in a Server-Timing response header (metrics are always on /metrics)
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "0") != "0"
+
 
 
 
@@ -26,30 +198,326 @@ def _active_api_key() -> Optional[str]:
   """Return the API key for the current request (user key first, else default)."""
   return current_api_key.get()
 
-def get_client():
-  """Return a Gemini client bound to the active (request-scoped) API key."""
-  key = _active_api_key()
-  if not key:
-    raise RuntimeError(
-      "No Gemini API key provided. Pass X-API-Key from the extension or set GOOGLE_API_KEY in .env."
-    )
-  return genai.Client(api_key=key)
 
-# Global variables to store video data
-_video_cache = {}
+def _create_backend(name):
+    """Build the LLM backend selected by LLM_BACKEND (settings read from the environment)."""
+    if name == "gemini":
+        return GeminiBackend(_active_api_key, pool_size=CLIENT_POOL_SIZE)
+    if name == "openai":
+        return OpenAIBackend(
+            _active_api_key,
+            base_url=os.getenv("OPENAI_BASE_URL"),
+            model_override=os.getenv("OPENAI_MODEL"),
+            default_key=os.getenv("OPENAI_API_KEY"),
+            pool_size=CLIENT_POOL_SIZE,
+        )
+    if name == "fake":
+        return FakeBackend(
+            latency=float(os.getenv("FAKE_LLM_LATENCY", 0.5)),
+            tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", 200)),
+            output_tokens=int(os.getenv("FAKE_LLM_OUTPUT_TOKENS", 400)),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", 0)),
+            seed=int(os.getenv("FAKE_LLM_SEED", 0)),
+        )
+    raise ValueError(f"Unknown LLM_BACKEND: {name!r}")
 
-def _extract_video_content(url):
-    
+_backend = _create_backend(LLM_BACKEND)
+
+
+def get_backend():
+    """Return the LLM backend all model calls go through."""
+    return _backend
+
+
+def set_backend(backend):
+    """Swap the LLM backend (e.g. a FakeBackend for load tests)."""
+    global _backend
+    _backend = backend
+
+
+# Retries, deadline and hedging shared by every model call
+_retry_policy = RetryPolicy(
+    attempts=LLM_RETRY_ATTEMPTS,
+    base_delay=LLM_RETRY_BASE_DELAY,
+    max_delay=LLM_RETRY_MAX_DELAY,
+    deadline=LLM_CALL_DEADLINE or None,
+    hedge_percentile=LLM_HEDGE_PERCENTILE,
+    hedge_min_samples=LLM_HEDGE_MIN_SAMPLES,
+    hedge_stages=LLM_HEDGE_STAGES,
+)
+
+
+async def _agenerate(stage, model_name, system_instructions, prompt, video=None):
+    """
+    Model call, retried on rate limits and server errors (see
+    resilience.RetryPolicy). Each attempt is timed and token-counted under
+    stage (see metrics.llm_call). Video calls are never hedged.
+    """
+    async def attempt():
+        with metrics.llm_call(stage, model_name) as call:
+            generation = await _backend.agenerate(model_name, system_instructions, prompt, video)
+            call.usage = generation.usage
+        return generation
+
+    return await _retry_policy.acall(stage, attempt, hedge=video is None)
+
+
+# The blocking wrappers (summarize_transcript, ...) run the async pipeline on one
+# long-lived loop, so pooled async SDK clients always belong to a running loop
+_blocking_loop = None
+_blocking_loop_lock = threading.Lock()
+
+
+def _run_blocking(coro):
+    """Run coro on the shared background loop, in the caller's context, and wait for its result."""
+    global _blocking_loop
+    with _blocking_loop_lock:
+        if _blocking_loop is None:
+            _blocking_loop = asyncio.new_event_loop()
+            threading.Thread(target=_blocking_loop.run_forever, name="model-blocking-loop", daemon=True).start()
+    context = copy_context()
+    result = Future()
+
+    def finish(task):
+        if task.cancelled():
+            result.cancel()
+        elif task.exception() is not None:
+            result.set_exception(task.exception())
+        else:
+            result.set_result(task.result())
+
+    def start():
+        _blocking_loop.create_task(coro, context=context).add_done_callback(finish)
+
+    _blocking_loop.call_soon_threadsafe(start)
+    return result.result()
+
+
+# Extracted video content: LRU by total size, TTL per entry, short TTL for errors
+_video_cache = VideoCache(
+    max_bytes=VIDEO_CACHE_MAX_BYTES,
+    ttl=VIDEO_CACHE_TTL,
+    error_ttl=VIDEO_CACHE_ERROR_TTL,
+    compress_min_bytes=VIDEO_CACHE_COMPRESS_MIN_BYTES,
+    hot_entries=VIDEO_CACHE_HOT_ENTRIES,
+)
+
+# Concurrent extractions of the same video share one Gemini call
+_extraction_flight = SingleFlight()
+
+
+# Generated outputs derived from an extraction; errors are never cached here
+_output_cache = VideoCache(
+    max_bytes=OUTPUT_CACHE_MAX_BYTES,
+    ttl=OUTPUT_CACHE_TTL,
+    error_ttl=0,
+    compress_min_bytes=VIDEO_CACHE_COMPRESS_MIN_BYTES,
+    hot_entries=VIDEO_CACHE_HOT_ENTRIES,
+)
+
+# Identical summary/quiz requests in flight at the same time share one generation
+_output_flight = SingleFlight()
+
+
+def _open_store():
+    """Open the shared extraction store, or return None if disabled/unavailable."""
+    if not EXTRACTION_STORE_PATH:
+        return None
+    try:
+        return ExtractionStore(EXTRACTION_STORE_PATH, lease_seconds=EXTRACTION_LEASE_SECONDS)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning("Extraction store disabled: %s", e)
+        return None
+
+_store = _open_store()
+
+_transcript_fetcher = YouTubeTranscriptFetcher() if TRANSCRIPT_TIER_ENABLED else None
+
+_duration_probe = YouTubeDurationProbe() if SEGMENTED_EXTRACTION_ENABLED else None
+
+
+async def _extract_video_content_async(url):
     """
     Private function to extract comprehensive video content using Gemini API.
     This content will be used for summary, quiz, and chat features.
+
+    Concurrent callers for the same video (e.g. /summarize, /quiz and /chat fired
+    together by the extension) wait on a single in-flight extraction. Every URL
+    variant of a video shares one cache entry and one extraction.
+
+    Raises:
+        InvalidVideoURL: If url is not a YouTube video URL
     """
-    client = get_client()
+    key, url = canonicalize(url)
+    cached = _video_cache.get(key)
+    if cached is not None:
+        return cached.value
+
+    with metrics.stage("extraction"):
+        return await _extraction_flight.do_async(key, lambda: _run_video_extraction_async(url, key))
+
+
+async def _run_video_extraction_async(url, key):
+    """
+    Resolve a cache miss for one video: reuse another worker's result from the
+    shared store if there is one, otherwise take the store lease and extract.
+    Store I/O runs in a worker thread.
+    """
+    # A flight that just finished may have filled the cache; the caller already
+    # counted this lookup as a miss
+    cached = _video_cache.peek(key)
+    if cached is not None:
+        return cached.value
+
+    stored = await asyncio.to_thread(metrics.queued(_wait_for_store, key))
+    if stored is not None:
+        return stored
+
+    try:
+        _backend.ensure_credentials()
+    except Exception:
+        await asyncio.to_thread(metrics.queued(_release_store_lease, key))
+        raise
+
+    renewal = asyncio.create_task(_renew_store_lease(key)) if _store is not None else None
+    try:
+        content, meta = await _generate_video_analysis_async(url, key)
+    except Exception as e:
+        error_msg = f"Error extracting video content: {str(e)}"
+        _video_cache.set(key, error_msg, is_error=True, url=url)
+        return error_msg
+    finally:
+        if renewal is not None:
+            renewal.cancel()
+        await asyncio.to_thread(metrics.queued(_release_store_lease, key))
+
+    _cache_extraction(key, content, url=url, **meta)
+    if not meta.get("partial"):
+        await asyncio.to_thread(metrics.queued(_save_to_store, key, content, url=url, **meta))
+    return content
+
+
+def _cache_extraction(key, content, **meta):
+    """Cache a finished extraction; partial ones expire like errors so they get retried soon."""
+    ttl = VIDEO_CACHE_ERROR_TTL if meta.get("partial") else None
+    _video_cache.set(key, content, ttl=ttl, **meta)
+
+
+def _wait_for_store(key):
+    """
+    Return stored content for key, waiting while another worker extracts it.
+
+    Returns None once this process holds the lease and should extract itself.
+    """
+    if _store is None:
+        return None
+    with metrics.stage("store_wait"):
+        return _read_or_lease(key)
+
+
+def _read_or_lease(key):
+    try:
+        while True:
+            stored = _store.get(key)
+            if stored is None:
+                if _store.acquire(key):
+                    # The previous lease holder may have finished just before we got in
+                    stored = _store.get(key)
+                    if stored is None:
+                        return None
+                else:
+                    # Another worker is extracting; None here means it gave up
+                    stored = _store.wait_for(key, timeout=EXTRACTION_LEASE_SECONDS)
+                    if stored is None:
+                        continue
+            content, meta = stored
+            _release_store_lease(key)
+            _video_cache.set(key, content, **meta)
+            return content
+    except sqlite3.Error as e:
+        logger.warning("Extraction store read failed for %s: %s", key, e)
+        return None
+
+
+async def _renew_store_lease(key):
+    """Keep our store lease alive while an extraction (with its retries) outlasts it."""
+    while True:
+        await asyncio.sleep(EXTRACTION_LEASE_SECONDS / 3)
+        try:
+            if not await asyncio.to_thread(_store.renew, key):
+                logger.warning("Extraction store lease for %s was taken over", key)
+                return
+        except sqlite3.Error as e:
+            logger.warning("Extraction store lease renewal failed for %s: %s", key, e)
+
+
+def _release_store_lease(key):
+    if _store is None:
+        return
+    try:
+        _store.release(key)
+    except sqlite3.Error as e:
+        logger.warning("Extraction store lease release failed for %s: %s", key, e)
+
+
+def _save_to_store(key, content, **meta):
+    if _store is None:
+        return
+    try:
+        _store.put(key, content, **meta)
+    except sqlite3.Error as e:
+        logger.warning("Extraction store write failed for %s: %s", key, e)
+
+
+def warm_video_cache(limit=None):
+    """
+    Load the most recent extractions from the shared store into memory so a
+    freshly started worker serves hits immediately.
+
+    Returns:
+        int: Number of videos loaded
+    """
+    if _store is None:
+        return 0
+    loaded = 0
+    try:
+        for key, content, meta in _store.recent(limit or WARM_START_ENTRIES):
+            if _video_cache.set(key, content, **meta) is not None:
+                loaded += 1
+    except sqlite3.Error as e:
+        logger.warning("Extraction store warm start failed: %s", e)
+    return loaded
 
-    if url in _video_cache:
-        return _video_cache[url]
-    
-    system_instructions = """You are a comprehensive AI video content analyzer. Your purpose is to extract detailed information from YouTube videos that will be used for multiple purposes: summarization, quiz generation, and interactive Q&A.
+
+def warm_up():
+    """
+    Get a new worker ready for its first requests: load recent extractions from
+    the shared store, import the LLM SDK and create the caption and video
+    length HTTP clients (all of which otherwise happen on first use). A step
+    that fails is logged and skipped.
+
+    Returns:
+        dict: Videos loaded and milliseconds spent per step
+    """
+    report = {}
+    started = time.perf_counter()
+    report["videos_loaded"] = warm_video_cache()
+    report["cache_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    for name, component in (("backend", _backend), ("transcripts", _transcript_fetcher), ("duration_probe", _duration_probe)):
+        warm = getattr(component, "warm", None)
+        if warm is None:
+            continue
+        started = time.perf_counter()
+        try:
+            warm()
+        except Exception as e:
+            logger.warning("Warm-up of %s failed: %s", name, e)
+        report[f"{name}_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("Worker warm-up: %s", report)
+    return report
+
+
+_ANALYSIS_INSTRUCTIONS = """You are a comprehensive AI video content analyzer. Your purpose is to extract detailed information from YouTube videos that will be used for multiple purposes: summarization, quiz generation, and interactive Q&A.
 
     Guidelines:
     1. Extract ALL important information, concepts, facts, and details from the video
@@ -65,10 +533,49 @@ def _extract_video_content(url):
 
     Provide a comprehensive analysis that captures the full educational value of the video."""
 
+
+def _video_analysis_request(url, segment=None):
+    """
+    Build the system instructions, prompt and video input for extracting url.
+
+    segment: optional (start, end) offsets in seconds to analyze only that part.
+    """
+    video = VideoInput(url)
+    segment_note = ""
+    if segment is not None:
+        start, end = segment
+        video = VideoInput(url, start, end)
+        segment_note = f"Analyze ONLY the part of the video from {start}s to {end}s; the other parts are analyzed separately."
+
     prompt = f"""
     Please provide a comprehensive content analysis of the following YouTube video:
 
     VIDEO URL: {url}
+    {segment_note}
+    Extract all important information including:
+    1. Main topics and subtopics covered
+    2. Key concepts, facts, and details
+    3. Examples, case studies, and specific instances mentioned
+    4. Technical information, processes, and methodologies
+    5. Important names, dates, numbers, and references
+    6. Conclusions, recommendations, and takeaways
+    7. Any supporting evidence or reasoning provided
+
+    This analysis will be used to generate summaries, create quizzes, and answer specific questions about the video content.
+    """
+
+    return _ANALYSIS_INSTRUCTIONS, prompt, video
+
+
+def _transcript_analysis_request(url, transcript_text):
+    """Build the system instructions and text-only prompt for analyzing captions."""
+    prompt = f"""
+    Please provide a comprehensive content analysis of the following YouTube video, based on its transcript:
+
+    VIDEO URL: {url}
+
+    TRANSCRIPT ([mm:ss] marks the time in the video):
+    {transcript_text}
 
     Extract all important information including:
     1. Main topics and subtopics covered
@@ -82,49 +589,224 @@ def _extract_video_content(url):
     This analysis will be used to generate summaries, create quizzes, and answer specific questions about the video content.
     """
 
+    return _ANALYSIS_INSTRUCTIONS, prompt
+
+
+def set_transcript_fetcher(fetcher):
+    """
+    Install the caption fetcher used by the transcript tier.
+
+    Args:
+        fetcher: Object with fetch(video_id) -> [{"text", "start", "duration"}, ...]
+            raising TranscriptUnavailable, or None to always analyze the video itself
+    """
+    global _transcript_fetcher
+    _transcript_fetcher = fetcher
+
+
+def _fetch_transcript(key):
+    """Return formatted captions for video key, or None if missing or too sparse."""
+    if _transcript_fetcher is None:
+        return None
     try:
-        response = client.models.generate_content(
-            model=SUMMARY_MODEL,
-            config=types.GenerateContentConfig(
-                system_instruction=system_instructions),
-            contents=types.Content(
-                parts=[
-                    types.Part(
-                        file_data=types.FileData(file_uri=url)
-                    ),
-                    types.Part(text=prompt)
-                ],
-            )
-        )
-        
-        # Cache the result
-        _video_cache[url] = response.text
-        return response.text
-        
+        with metrics.stage("transcript_fetch"):
+            snippets = _transcript_fetcher.fetch(key)
+    except TranscriptUnavailable:
+        return None
     except Exception as e:
-        error_msg = f"Error extracting video content: {str(e)}"
-        _video_cache[url] = error_msg
-        return error_msg
+        logger.warning("Transcript fetch failed for %s: %s", key, e)
+        return None
+    if not is_usable(snippets, TRANSCRIPT_MIN_WORDS, TRANSCRIPT_MIN_WORDS_PER_MINUTE):
+        return None
+    return format_transcript(snippets)
 
 
-def summarize_transcript(url, max_length=800):
+def set_duration_probe(probe):
     """
-    Summarizes a video transcript using pre-extracted video content.
+    Install the probe used to find long videos for segmented extraction.
 
     Args:
-        url (str): The YouTube video URL
-        max_length (int): Maximum desired length of the summary
+        probe: Object with duration(video_id) -> seconds or None, or None to
+            never segment
+    """
+    global _duration_probe
+    _duration_probe = probe
 
-    Returns:
-        str: A concise summary of the transcript
+
+def _plan_video_segments(key):
+    """Return (start, end) segments for a long video, or None to analyze it in one call."""
+    if _duration_probe is None:
+        return None
+    try:
+        with metrics.stage("duration_probe"):
+            duration = _duration_probe.duration(key)
+    except Exception as e:
+        logger.warning("Duration probe failed for %s: %s", key, e)
+        return None
+    if not duration or duration <= LONG_VIDEO_SECONDS:
+        return None
+    return plan_segments(duration, SEGMENT_SECONDS)
+
+
+def _merge_segment_results(segments, results):
+    """
+    Merge per-segment results (text or the exception that ended its retries)
+    into (analysis text, metadata). Raises if every segment failed.
     """
-    client = get_client()
+    failed = [r for r in results if isinstance(r, Exception)]
+    if len(failed) == len(results):
+        raise failed[-1]
+    content = merge_segments(segments, [None if isinstance(r, Exception) else r for r in results])
+    return content, {"tier": "video", "segments": len(segments), "partial": bool(failed)}
 
-    # Get comprehensive video content (cached if already extracted)
-    video_content = _extract_video_content(url)
-    
-    
 
+async def _generate_analysis_async(system_instructions, prompt, video=None, stage="analysis"):
+    return (await _agenerate(stage, SUMMARY_MODEL, system_instructions, prompt, video)).text
+
+
+async def _analyze_segment_async(url, segment):
+    """Analyze one segment, retrying just that segment; returns text or the last exception."""
+    for attempt in range(SEGMENT_RETRIES + 1):
+        try:
+            return await _generate_analysis_async(*_video_analysis_request(url, segment), stage="segment_analysis")
+        except Exception as e:
+            error = e
+            if attempt < SEGMENT_RETRIES:
+                await asyncio.sleep(2 ** attempt)
+    return error
+
+
+async def _generate_video_analysis_async(url, key):
+    """
+    Run the extraction for url and return (analysis text, metadata).
+
+    metadata["tier"] is "transcript" when captions were analyzed as text, or
+    "video" for the multimodal analysis used when captions are missing or too
+    sparse. Long videos are analyzed as concurrent time segments; if some
+    segments still fail after their retries, metadata["partial"] is True.
+    """
+    transcript_text = await asyncio.to_thread(metrics.queued(_fetch_transcript, key))
+    if transcript_text is not None:
+        content = await _generate_analysis_async(*_transcript_analysis_request(url, transcript_text))
+        return content, {"tier": "transcript"}
+
+    segments = await asyncio.to_thread(metrics.queued(_plan_video_segments, key))
+    if segments is None:
+        return await _generate_analysis_async(*_video_analysis_request(url)), {"tier": "video"}
+
+    semaphore = asyncio.Semaphore(SEGMENT_CONCURRENCY)
+
+    async def analyze(segment):
+        async with semaphore:
+            return await _analyze_segment_async(url, segment)
+
+    results = await asyncio.gather(*(analyze(segment) for segment in segments))
+    return _merge_segment_results(segments, results)
+
+
+def _output_key(kind, url, video_content, version, model_name, **params):
+    """
+    Output cache key, or None if the output must not be cached (the extraction
+    failed). The content hash makes a re-extraction invalidate derived outputs.
+    """
+    if video_content.startswith("Error"):
+        return None
+    return (kind, video_id(url), hash(video_content), version, model_name, tuple(sorted(params.items())))
+
+
+def _summary_key(url, video_content, max_length):
+    return _output_key("summary", url, video_content, SUMMARY_PROMPT_VERSION, SUMMARY_MODEL, max_length=max_length)
+
+
+def _summary_tree_key(url, video_content):
+    return _output_key("summary_tree", url, video_content, SUMMARY_TREE_PROMPT_VERSION, SUMMARY_MODEL)
+
+
+def _quiz_key(url, video_content, num_questions, previous_questions):
+    # Quizzes that must avoid a user's previous questions are personal; don't share them
+    if previous_questions:
+        return None
+    return _output_key("quiz", url, video_content, QUIZ_PROMPT_VERSION, QUIZ_MODEL, num_questions=num_questions)
+
+
+def _store_output(key, output):
+    if key is not None and output and not output.startswith("Error"):
+        _output_cache.set(key, output)
+    return output
+
+
+async def _cached_output_async(key, generate):
+    """
+    Return a generated output (generate returns a coroutine) through the output cache.
+
+    Concurrent identical requests share one generation. Errors are returned
+    but not cached. With bypass_output_cache set the output is regenerated
+    (and the cache refreshed).
+    """
+    if key is None:
+        return await generate()
+    if bypass_output_cache.get():
+        return _store_output(key, await generate())
+    cached = _output_cache.get(key)
+    if cached is not None:
+        return cached.value
+
+    async def generate_and_store():
+        return _store_output(key, await generate())
+
+    return await _output_flight.do_async(key, generate_and_store)
+
+
+# Summary/quiz/chat prompts are sent as segments (see backends.prompt_segments): fixed
+# text, the cached analysis itself, and a small per-request part, so the
+# multi-KB analysis is never copied into a new string per request
+_SUMMARY_PROMPT_HEAD = """
+    Based on the following comprehensive video content analysis, create a well-structured markdown summary:
+
+    VIDEO CONTENT:
+    """
+
+
+@lru_cache(maxsize=64)
+def _summary_prompt_tail(max_length):
+    return f"""
+
+    Create a summary that follows this exact structure:
+
+    1. Start with # (Main part of video tittle) as the main title
+
+    2. Begin with a brief introduction paragraph that uses **bold** for key terms
+
+    3. Include these main sections using ## headings:
+       - ## Overview
+       - ## Key Points
+       - ## Important Details
+       - ## Key Takeaways
+
+    4. Under each section:
+       - Always use bullet points (- ) for listing related items
+       - Use *italic* for emphasis and explanations
+       - Use > for highlighting crucial information
+       - Break complex ideas into sub-bullets
+
+    5. End with a "## Key Takeaways" section that summarizes the most important points using bullet points
+
+    Make the summary comprehensive yet concise, keeping it under and close to {max_length} words while ensuring proper markdown formatting for optimal readability.
+
+    Remember to:
+    - Use proper markdown syntax for all formatting
+    - Maintain clear hierarchy in headings
+    - Use bullet points for better organization
+    - Bold key terms and concepts
+    - Include relevant numerical data and specifics
+    - End with actionable takeaways
+
+    Format your response entirely in markdown, ensuring each section is properly formatted and visually organized.
+    """
+
+
+def _summary_prompt(video_content, max_length):
+    """Build the system instructions and prompt for a markdown summary."""
     system_instructions = """
 You are a specialized AI text summarization assistant that produces well-structured, markdown-formatted summaries. 
 Your output should be concise (≈30% of original length), visually organized, and easy to scan.
@@ -162,77 +844,142 @@ Required Output Structure
 """
 
 
-    prompt = f"""
-    Based on the following comprehensive video content analysis, create a well-structured markdown summary:
+    prompt = (_SUMMARY_PROMPT_HEAD, video_content, _summary_prompt_tail(max_length))
+    return system_instructions, prompt
+
+
+_SUMMARY_TREE_PROMPT_HEAD = """
+    Based on the following comprehensive video content analysis, build a layered summary of the video.
 
     VIDEO CONTENT:
-    {video_content}
+    """
 
-    Create a summary that follows this exact structure:
 
-    1. Start with # (Main part of video tittle) as the main title
+@lru_cache(maxsize=8)
+def _summary_tree_prompt_tail(words):
+    return f"""
 
-    2. Begin with a brief introduction paragraph that uses **bold** for key terms
+    Split the video into its main sections, in the order they appear. For each section
+    write a one-sentence summary and its key points, most important first. Together the
+    key points should come to about {words} words; make each one a self-contained sentence
+    so any prefix of them still reads well.
+    """
 
-    3. Include these main sections using ## headings:
-       - ## Overview
-       - ## Key Points
-       - ## Important Details
-       - ## Key Takeaways
 
-    4. Under each section:
-       - Always use bullet points (- ) for listing related items
-       - Use *italic* for emphasis and explanations
-       - Use > for highlighting crucial information
-       - Break complex ideas into sub-bullets
+def _summary_tree_prompt(video_content):
+    """Build the system instructions and prompt for a summary tree (JSON)."""
+    system_instructions = """
+You are a specialized AI text summarization assistant. You summarize videos as a tree
+from which summaries of any length can be assembled.
 
-    5. End with a "## Key Takeaways" section that summarizes the most important points using bullet points
+Content Guidelines
+- Capture the most important concepts, facts, and conclusions.
+- Preserve the original sequence of ideas.
+- Use clear, direct language appropriate for educational and professional contexts.
+- Retain names, numbers, dates, and technical terms when relevant.
+- Avoid redundancy between sections, points and takeaways.
+- Inline markdown (**bold** key terms, *italic*, `code`) is allowed inside strings; no headings or bullets.
+
+Respond with JSON only, in exactly this format:
+{
+  "title": "Short title of the video",
+  "introduction": "2-3 sentences setting the context, with **bold** key terms",
+  "takeaways": ["3-5 sentences that summarize the essence of the whole video"],
+  "sections": [
+    {
+      "heading": "Section heading",
+      "summary": "One sentence summarizing the section",
+      "points": ["Most important point", "Next point", "..."]
+    }
+  ]
+}
+"""
+    prompt = (_SUMMARY_TREE_PROMPT_HEAD, video_content, _summary_tree_prompt_tail(SUMMARY_TREE_WORDS))
+    return system_instructions, prompt
 
-    Make the summary comprehensive yet concise, keeping it under and close to {max_length} words while ensuring proper markdown formatting for optimal readability.
 
-    Remember to:
-    - Use proper markdown syntax for all formatting
-    - Maintain clear hierarchy in headings
-    - Use bullet points for better organization
-    - Bold key terms and concepts
-    - Include relevant numerical data and specifics
-    - End with actionable takeaways
+_summary_tree_counts = {"assembled": 0, "fallbacks": 0}
+_summary_tree_counts_lock = threading.Lock()
 
-    Format your response entirely in markdown, ensuring each section is properly formatted and visually organized.
+
+def _uses_summary_tree(max_length):
+    return SUMMARY_TREE_ENABLED and SUMMARY_TREE_MIN_LENGTH <= max_length <= SUMMARY_TREE_WORDS
+
+
+def _assemble_summary(text, max_length):
+    """Summary of max_length words assembled from a summary tree generation, or None."""
+    tree = parse_summary_tree(text) if text and not text.startswith("Error") else None
+    summary = tree.render(max_length, SUMMARY_TREE_MIN_FILL) if tree is not None else None
+    with _summary_tree_counts_lock:
+        _summary_tree_counts["assembled" if summary is not None else "fallbacks"] += 1
+    return summary
+
+
+async def _summary_from_tree_async(url, video_content, max_length):
+    """
+    Summary assembled from the video's summary tree (generated once and cached),
+    or None if the tree is unavailable or can't serve max_length.
     """
+    key = _summary_tree_key(url, video_content)
+    if key is None or not _uses_summary_tree(max_length):
+        return None
 
-    try:
-        response = client.models.generate_content(
-            model=SUMMARY_MODEL,
-            config=types.GenerateContentConfig(
-                system_instruction=system_instructions),
-            contents=types.Content(
-                parts=[types.Part(text=prompt)]
-            )
-        )
-        return response.text
-    except Exception as e:
-        return f"Error generating summary: {str(e)}"
+    async def generate():
+        try:
+            return (await _agenerate("summary_tree", SUMMARY_MODEL, *_summary_tree_prompt(video_content))).text
+        except Exception as e:
+            return f"Error generating summary tree: {str(e)}"
 
+    return _assemble_summary(await _cached_output_async(key, generate), max_length)
 
-def generate_quiz(url, num_questions=6, previous_questions=None):
+
+async def summarize_transcript_async(url, max_length=800):
     """
-    Generates a quiz based on pre-extracted video content using Gemini API.
-    
+    Summarizes a video transcript using pre-extracted video content.
+
     Args:
         url (str): The YouTube video URL
-        num_questions (int): Number of questions to generate
-        
+        max_length (int): Maximum desired length of the summary
+
     Returns:
-        dict: A JSON-formatted quiz with questions, options, and answers
+        str: A concise summary of the transcript
     """
-    client = get_client()
+    _backend.ensure_credentials()
+
+    video_content = await _extract_video_content_async(url)
+
+    async def generate():
+        summary = await _summary_from_tree_async(url, video_content, max_length)
+        if summary is not None:
+            return summary
+        system_instructions, prompt = _summary_prompt(video_content, max_length)
+        try:
+            response = await _agenerate("summary", SUMMARY_MODEL, system_instructions, prompt)
+            return response.text
+        except Exception as e:
+            return f"Error generating summary: {str(e)}"
+
+    return await _cached_output_async(_summary_key(url, video_content, max_length), generate)
+
+
+def summarize_transcript(url, max_length=800):
+    """Blocking summarize_transcript_async, for scripts and other blocking callers."""
+    return _run_blocking(summarize_transcript_async(url, max_length))
 
-    # Get comprehensive video content (cached if already extracted)
-    video_content = _extract_video_content(url)
-    
-    
 
+_QUIZ_PROMPT_TAIL = """
+
+    For each question:
+    1. Write a clear question that tests understanding of key concepts from the video
+    2. Provide 4 options labeled A, B, C, and D
+    3. Indicate the correct answer after each question
+    4. Ensure questions cover different parts or concepts from the video
+    5. Include at least one higher-level thinking question that requires analysis or application
+    """
+
+
+def _quiz_prompt(video_content, num_questions, previous_questions):
+    """Build the system instructions and prompt for a multiple-choice quiz."""
     system_instructions = f"""
     You are a specialized AI quiz generator. Create educational assessment questions based on video content that test understanding and retention of key concepts.
     
@@ -269,52 +1016,296 @@ def generate_quiz(url, num_questions=6, previous_questions=None):
     
     previous_questions = previous_questions or []
     # Pass previous_questions to Gemini in the prompt:
-    prompt = f"""
+    prompt_head = f"""
     Based on the following video content analysis, generate {num_questions} multiple-choice questions that are NOT similar to these previous questions:
     PREVIOUS QUESTIONS:
     {previous_questions}
     VIDEO CONTENT:
-    {video_content}
-
-    For each question:
-    1. Write a clear question that tests understanding of key concepts from the video
-    2. Provide 4 options labeled A, B, C, and D
-    3. Indicate the correct answer after each question
-    4. Ensure questions cover different parts or concepts from the video
-    5. Include at least one higher-level thinking question that requires analysis or application
     """
-    
+    prompt = (prompt_head, video_content, _QUIZ_PROMPT_TAIL)
+    return system_instructions, prompt
+
+
+# Question banks keyed by video ID: (extraction content hash, QuestionBank)
+_quiz_banks = LRUCache(maxsize=QUIZ_BANK_CACHE_SIZE)
+_quiz_banks_lock = threading.Lock()
+# Concurrent fills of the same video's bank share one generation
+_quiz_bank_flight = SingleFlight()
+# Videos with a background top-up running, and the asyncio tasks doing it
+_quiz_bank_refills = set()
+_background_tasks = set()
+
+
+def _content_hash(video_content):
+    """Stable hash of an extraction (unlike hash(), the same in every worker)."""
+    return hashlib.sha1(video_content.encode("utf-8")).hexdigest()
+
+
+def _new_quiz_bank(questions=()):
+    return QuestionBank(questions, threshold=QUIZ_SIMILARITY_THRESHOLD, max_size=QUIZ_BANK_MAX_QUESTIONS)
+
+
+def _cached_quiz_bank(key, content_hash):
+    """Return the bank built from this extraction, from memory or the shared store, or None."""
+    with _quiz_banks_lock:
+        entry = _quiz_banks.get(key)
+    if entry is not None and entry[0] == content_hash:
+        return entry[1]
+    if _store is None:
+        return None
     try:
-        response = client.models.generate_content(
-            model=QUIZ_MODEL,
-            config=types.GenerateContentConfig(
-                system_instruction=system_instructions),
-            contents=types.Content(
-                parts=[types.Part(text=prompt)]
-            )
-        )
-        return response.text
+        stored = _store.get_quiz_bank(key, content_hash)
+    except sqlite3.Error as e:
+        logger.warning("Quiz bank read failed for %s: %s", key, e)
+        return None
+    if not stored:
+        return None
+    bank = _new_quiz_bank(stored)
+    with _quiz_banks_lock:
+        _quiz_banks[key] = (content_hash, bank)
+    return bank
+
+
+def _quiz_bank_request(video_content, bank):
+    """Prompt for the next batch, steering the model away from questions already banked."""
+    existing = [q["question"] for q in bank.questions()] if bank is not None else []
+    return _quiz_prompt(video_content, QUIZ_BANK_BATCH, existing)
+
+
+def _merge_quiz_batch(key, content_hash, bank, text):
+    """Add a generated batch to bank (or start a new one), cache and persist it."""
+    questions = parse_questions(text)
+    if bank is None:
+        bank = _new_quiz_bank(questions)
+    else:
+        bank.add(questions)
+    if not len(bank):
+        raise ValueError("the model returned no usable questions")
+    with _quiz_banks_lock:
+        _quiz_banks[key] = (content_hash, bank)
+    if _store is not None:
+        try:
+            _store.put_quiz_bank(key, content_hash, bank.questions())
+        except sqlite3.Error as e:
+            logger.warning("Quiz bank write failed for %s: %s", key, e)
+    return bank
+
+
+async def _fill_quiz_bank_async(key, content_hash, video_content, bank):
+    """Generate one batch into the video's bank (creating it if bank is None); returns the bank."""
+    async def run():
+        text = (await _agenerate("quiz_bank", QUIZ_MODEL, *_quiz_bank_request(video_content, bank))).text
+        return await asyncio.to_thread(metrics.queued(_merge_quiz_batch, key, content_hash, bank, text))
+
+    return await _quiz_bank_flight.do_async(key, run)
+
+
+def _claim_refill(key):
+    """Whether the caller should start a background top-up for key (one at a time per video)."""
+    with _quiz_banks_lock:
+        if key in _quiz_bank_refills:
+            return False
+        _quiz_bank_refills.add(key)
+        return True
+
+
+async def _refill_quiz_bank_async(key, content_hash, video_content, bank):
+    """Background top-up task, admitted as background work; failures are logged, the bank stays as it is."""
+    try:
+        async with admission.admit(BACKGROUND):
+            await _fill_quiz_bank_async(key, content_hash, video_content, bank)
     except Exception as e:
-        return f"Error generating quiz: {str(e)}"
+        logger.warning("Quiz bank refill failed for %s: %s", key, e)
+    finally:
+        with _quiz_banks_lock:
+            _quiz_bank_refills.discard(key)
 
 
-def ask_question_about_video(url, question, history=None):
+async def _quiz_from_bank_async(key, content_hash, video_content, num_questions, previous_questions):
     """
-    Ask a specific question about a video using pre-extracted content and chat history.
+    Serve num_questions unseen questions from the video's bank.
+
+    Only a user who has seen nearly the whole bank waits for a new batch;
+    otherwise a batch is added in the background task once few unseen
+    ones remain.
+    """
+    bank = await asyncio.to_thread(metrics.queued(_cached_quiz_bank, key, content_hash))
+    if bank is None:
+        bank = await _fill_quiz_bank_async(key, content_hash, video_content, None)
+    questions, left = bank.select(num_questions, previous_questions)
+    if len(questions) < num_questions and not bank.is_full():
+        bank = await _fill_quiz_bank_async(key, content_hash, video_content, bank)
+        questions, left = bank.select(num_questions, previous_questions)
+    elif left < QUIZ_BANK_LOW_WATER and not bank.is_full() and _claim_refill(key):
+        task = asyncio.create_task(_refill_quiz_bank_async(key, content_hash, video_content, bank))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    return questions
+
+
+async def generate_quiz_async(url, num_questions=6, previous_questions=None):
+    """
+    Generates a quiz based on pre-extracted video content using Gemini API.
 
+    With the quiz bank enabled, questions are served from the video's bank,
+    skipping any similar to previous_questions, instead of a generation per call
+    (unless bypass_output_cache is set, which always generates a fresh quiz).
+    
     Args:
         url (str): The YouTube video URL
-        question (str): The question to ask about the video
-        history (list): List of previous Q&A dicts: [{ "question": ..., "answer": ... }, ...]
-
+        num_questions (int): Number of questions to generate
+        previous_questions (list): Question texts the user has already seen
+        
     Returns:
-        str: Answer to the question based on video content and chat history
+        str: A JSON-formatted quiz with questions, options, and answers
+        (an empty question list once the user has seen every question)
+    """
+    _backend.ensure_credentials()
+
+    video_content = await _extract_video_content_async(url)
+
+    # Cache-Control: no-cache asks for freshly generated questions, not banked ones
+    if QUIZ_BANK_ENABLED and not bypass_output_cache.get() and not video_content.startswith("Error"):
+        try:
+            questions = await _quiz_from_bank_async(
+                video_id(url), _content_hash(video_content), video_content, num_questions, previous_questions
+            )
+        except Exception as e:
+            return f"Error generating quiz: {str(e)}"
+        return json.dumps({"questions": questions})
+
+    async def generate():
+        system_instructions, prompt = _quiz_prompt(video_content, num_questions, previous_questions)
+        try:
+            response = await _agenerate("quiz", QUIZ_MODEL, system_instructions, prompt)
+            return response.text
+        except Exception as e:
+            return f"Error generating quiz: {str(e)}"
+
+    return await _cached_output_async(_quiz_key(url, video_content, num_questions, previous_questions), generate)
+
+
+def generate_quiz(url, num_questions=6, previous_questions=None):
+    """Blocking generate_quiz_async, for scripts and other blocking callers."""
+    return _run_blocking(generate_quiz_async(url, num_questions, previous_questions))
+
+
+# Section indexes keyed by (video ID, content hash) so a re-extraction gets a fresh index
+_section_indexes = LRUCache(maxsize=SECTION_INDEX_CACHE_SIZE)
+_section_indexes_lock = threading.Lock()
+
+
+def _chat_context(url, video_content, question):
+    """
+    Return (context, is_full): the parts of the analysis relevant to question,
+    within CHAT_CONTEXT_TOKEN_BUDGET, or the full analysis for broad questions.
+    """
+    if video_content.startswith("Error"):
+        return video_content, True
+
+    with metrics.stage("retrieval"):
+        index_key = (video_id(url), hash(video_content))
+        with _section_indexes_lock:
+            index = _section_indexes.get(index_key)
+        if index is None:
+            index = SectionIndex(video_content)
+            with _section_indexes_lock:
+                _section_indexes[index_key] = index
+
+        return select_context(index, question, CHAT_CONTEXT_TOP_K, CHAT_CONTEXT_TOKEN_BUDGET)
+
+
+# Answers to history-free chat questions, per (video ID, extraction hash)
+_answer_caches = LRUCache(maxsize=ANSWER_CACHE_VIDEOS)
+_answer_caches_lock = threading.Lock()
+_answer_cache_counts = {"hits": 0, "misses": 0, "stores": 0}
+
+
+def _answer_cache_applies(video_content, history):
+    # Answers that depend on earlier turns aren't reusable by other students
+    return ANSWER_CACHE_ENABLED and not history and not video_content.startswith("Error")
+
+
+def _cached_answer(url, video_content, question, history):
+    """
+    Stored answer to an earlier question close enough to question, or None.
+    Only history-free questions are matched; Cache-Control: no-cache skips the
+    lookup (the fresh answer then replaces the stored one).
     """
-    client = get_client()
+    if not _answer_cache_applies(video_content, history) or bypass_output_cache.get():
+        return None
+    with metrics.stage("answer_cache"):
+        with _answer_caches_lock:
+            answers = _answer_caches.get((video_id(url), hash(video_content)))
+        match = answers.lookup(question) if answers is not None else None
+    with _answer_caches_lock:
+        _answer_cache_counts["hits" if match else "misses"] += 1
+    return match[0] if match else None
+
+
+def _store_answer(url, video_content, question, history, answer):
+    if not _answer_cache_applies(video_content, history) or not answer or answer.startswith("Error"):
+        return answer
+    key = (video_id(url), hash(video_content))
+    with _answer_caches_lock:
+        answers = _answer_caches.get(key)
+        if answers is None:
+            answers = _answer_caches[key] = VideoAnswers(ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_MAX_PER_VIDEO)
+        _answer_cache_counts["stores"] += 1
+    answers.add(question, answer)
+    return answer
+
+
+_history_manager = HistoryManager(
+    token_budget=CHAT_HISTORY_TOKEN_BUDGET,
+    keep_turns=CHAT_HISTORY_KEEP_TURNS,
+    fold_turns=CHAT_HISTORY_FOLD_TURNS,
+)
+
+_HISTORY_SUMMARY_INSTRUCTIONS = """
+You condense tutoring conversations about a video. Write a compact running summary
+(at most 150 words) of what the student asked and what they were told, keeping
+names, numbers and definitions that later questions might refer back to.
+"""
+
+
+def _history_summary_prompt(previous_summary, turns_text):
+    return f"""
+SUMMARY SO FAR:
+{previous_summary or "(none)"}
+
+NEW TURNS:
+{turns_text}
+
+Return the updated summary only.
+"""
+
 
-    # Get comprehensive video content (cached if already extracted)
-    video_content = _extract_video_content(url)
+async def _summarize_history_async(previous_summary, turns_text):
+    """Fold turns_text into previous_summary (raises on failure so it isn't cached)."""
+    response = await _agenerate("history_summary", CHAT_MODEL, _HISTORY_SUMMARY_INSTRUCTIONS, _history_summary_prompt(previous_summary, turns_text))
+    return response.text.strip()
 
+
+_CHAT_PROMPT_HEAD = """
+You are answering as SmartEd AI.
+
+VIDEO CONTENT ANALYSIS (Transcript Extracted):
+"""
+_CHAT_PROMPT_HEAD_EXCERPTS = """
+You are answering as SmartEd AI.
+
+VIDEO CONTENT ANALYSIS (Transcript Extracted, sections relevant to the question):
+"""
+
+
+def _chat_prompt(video_content, question, history_text, is_full=True):
+    """
+    Build the system instructions and prompt for a question about the video.
+
+    video_content may be only the relevant excerpts of the analysis (is_full=False);
+    history_text is the chat history already compacted to its token budget.
+    """
     system_instructions = """
 Your name is SmartEd AI, a versatile educational assistant.
 You must answer every question the user asks.
@@ -325,18 +1316,8 @@ You must answer every question the user asks.
 - Use the previous chat history to maintain context and continuity in your answers.
 """
 
-    # Format chat history for the prompt
-    history_text = ""
-    if history:
-        history_text = "\n".join(
-            [f"Q{idx+1}: {h['question']}\nA{idx+1}: {h['answer']}" for idx, h in enumerate(history)]
-        )
-
-    prompt = f"""
-You are answering as SmartEd AI.
-
-VIDEO CONTENT ANALYSIS (Transcript Extracted):
-{video_content}
+    head = _CHAT_PROMPT_HEAD if is_full else _CHAT_PROMPT_HEAD_EXCERPTS
+    prompt_tail = f"""
 
 CHAT HISTORY:
 {history_text}
@@ -348,24 +1329,144 @@ INSTRUCTION:
 - If the user’s question is about the video, answer using only the VIDEO CONTENT ANALYSIS and the chat history above.
 - If it is not related to the video, answer with your general knowledge.
 """
+    prompt = (head, video_content, prompt_tail)
+    return system_instructions, prompt
+
+
+async def ask_question_about_video_async(url, question, history=None):
+    """
+    Ask a specific question about a video using pre-extracted content and chat history.
+
+    Args:
+        url (str): The YouTube video URL
+        question (str): The question to ask about the video
+        history (list): List of previous Q&A dicts: [{ "question": ..., "answer": ... }, ...]
+
+    Returns:
+        str: Answer to the question based on video content and chat history
+    """
+    _backend.ensure_credentials()
+
+    video_content = await _extract_video_content_async(url)
+    cached = _cached_answer(url, video_content, question, history)
+    if cached is not None:
+        return cached
+    context, is_full = _chat_context(url, video_content, question)
+    history_text = await _history_manager.compact_async(history, _summarize_history_async)
+    system_instructions, prompt = _chat_prompt(context, question, history_text, is_full)
 
     try:
-        response = client.models.generate_content(
-            model=CHAT_MODEL,
-            config=types.GenerateContentConfig(
-                system_instruction=system_instructions
-            ),
-            contents=types.Content(
-                parts=[types.Part(text=prompt)]
-            )
-        )
+        response = await _agenerate("chat", CHAT_MODEL, system_instructions, prompt)
 
-        return response.text
+        return _store_answer(url, video_content, question, history, response.text)
 
     except Exception as e:
         return f"Error generating answer: {str(e)}"
 
 
+def ask_question_about_video(url, question, history=None):
+    """Blocking ask_question_about_video_async, for scripts and other blocking callers."""
+    return _run_blocking(ask_question_about_video_async(url, question, history))
+
+
+async def _stream_generation(stage, model, system_instructions, prompt):
+    """
+    Stream a text generation, yielding (text, usage) per chunk.
+
+    Closing this generator (e.g. when the client disconnects) closes the
+    upstream stream, which stops the generation.
+    """
+    async def attempt():
+        with metrics.llm_call(stage, model) as call:
+            async with aclosing(_backend.astream(model, system_instructions, prompt)) as stream:
+                async for text, usage in stream:
+                    if usage:
+                        call.usage = usage
+                    if text:
+                        call.first_token()
+                    yield text, usage
+
+    # Retried only until the first chunk has been sent on
+    async with aclosing(_retry_policy.astream(stage, attempt)) as stream:
+        async for chunk in stream:
+            yield chunk
+
+
+async def summarize_transcript_stream(url, max_length=800):
+    """
+    Stream a summary of the video as it is generated.
+
+    Yields:
+        tuple: (text, usage) per chunk; usage is a dict of token counts on the
+        chunks that carry it (usually the last), else None
+
+    Raises:
+        RuntimeError: If the video content could not be extracted
+    """
+    _backend.ensure_credentials()
+    video_content = await _extract_video_content_async(url)
+    if video_content.startswith("Error"):
+        raise RuntimeError(video_content)
+
+    key = _summary_key(url, video_content, max_length)
+    if key is not None and not bypass_output_cache.get():
+        cached = _output_cache.get(key)
+        if cached is not None:
+            yield cached.value, None
+            return
+        # A tree already built for another length serves this one at once; the
+        # stream doesn't wait for a new tree, which would delay its first token
+        tree_key = _summary_tree_key(url, video_content)
+        tree = _output_cache.get(tree_key) if _uses_summary_tree(max_length) else None
+        summary = _assemble_summary(tree.value, max_length) if tree is not None else None
+        if summary is not None:
+            yield _store_output(key, summary), None
+            return
+
+    system_instructions, prompt = _summary_prompt(video_content, max_length)
+    parts = []
+    async with aclosing(_stream_generation("summary_stream", SUMMARY_MODEL, system_instructions, prompt)) as stream:
+        async for text, usage in stream:
+            if text:
+                parts.append(text)
+            yield text, usage
+    # Only a stream that ran to completion is cached
+    _store_output(key, "".join(parts))
+
+
+async def ask_question_about_video_stream(url, question, history=None):
+    """
+    Stream an answer to a question about the video as it is generated.
+
+    Yields:
+        tuple: (text, usage) per chunk, as for summarize_transcript_stream
+
+    Raises:
+        RuntimeError: If the video content could not be extracted
+    """
+    _backend.ensure_credentials()
+    video_content = await _extract_video_content_async(url)
+    if video_content.startswith("Error"):
+        raise RuntimeError(video_content)
+
+    cached = _cached_answer(url, video_content, question, history)
+    if cached is not None:
+        yield cached, None
+        return
+
+    context, is_full = _chat_context(url, video_content, question)
+    history_text = await _history_manager.compact_async(history, _summarize_history_async)
+    system_instructions, prompt = _chat_prompt(context, question, history_text, is_full)
+    parts = []
+    async with aclosing(_stream_generation("chat_stream", CHAT_MODEL, system_instructions, prompt)) as stream:
+        async for text, usage in stream:
+            if text:
+                parts.append(text)
+            yield text, usage
+    # Only a stream that ran to completion is cached
+    _store_answer(url, video_content, question, history, "".join(parts))
+
+
 def preload_video_content(url):
     """
     Preload video content for faster subsequent operations.
@@ -379,21 +1480,154 @@ def preload_video_content(url):
     """
     
     try:
-        content = _extract_video_content(url)
-        return not content
+        content = _run_blocking(_extract_video_content_async(url))
+        return bool(content) and not content.startswith("Error")
     except Exception:
         return False
 
 
-def clear_video_cache():
-    """Clear the video content cache to free memory."""
-    global _video_cache
+def is_video_cached(url):
+    """Whether a successful extraction of url is already in the video cache (not counted as a lookup)."""
+    entry = _video_cache.peek(video_id(url))
+    return entry is not None and not entry.is_error
+
+
+def clear_video_cache(persistent=False):
+    """Clear the video content, output, quiz bank and answer caches to free memory (and the shared store if persistent)."""
     _video_cache.clear()
+    _output_cache.clear()
+    with _quiz_banks_lock:
+        _quiz_banks.clear()
+    with _answer_caches_lock:
+        _answer_caches.clear()
+    if persistent and _store is not None:
+        _store.clear()
 
 
 def get_cached_videos():
-    """Get list of URLs that have cached content."""
-    return list(_video_cache.keys())
+    """Get list of URLs that have cached content (errors excluded)."""
+    return [entry.meta.get("url", key) for key, entry in _video_cache.items() if not entry.is_error]
+
+
+def get_cache_stats():
+    """Get video cache hit/miss/eviction counters and memory usage."""
+    return _video_cache.stats()
+
+
+def get_output_cache_stats():
+    """Get summary/quiz output cache hit/miss/eviction counters and memory usage."""
+    return _output_cache.stats()
+
+
+def get_answer_cache_stats():
+    """Get semantic answer cache hits, misses, stores and size."""
+    with _answer_caches_lock:
+        counts = dict(_answer_cache_counts)
+        caches = [answers for _, answers in _answer_caches.items()]
+    lookups = counts["hits"] + counts["misses"]
+    return {
+        **counts,
+        "hit_rate": counts["hits"] / lookups if lookups else 0.0,
+        "videos": len(caches),
+        "entries": sum(len(answers) for answers in caches),
+        "bytes": sum(answers.nbytes for answers in caches),
+    }
+
+
+def get_video_memory():
+    """
+    Memory held per cached video: its extraction and the summaries/quizzes
+    derived from it, as stored (compressed) and uncompressed bytes.
+
+    Returns:
+        list: [{"video_id", "bytes", "raw_bytes", "extraction_bytes",
+        "extraction_raw_bytes", "extraction_hot", "outputs", "output_bytes",
+        "output_raw_bytes"}, ...], largest first
+    """
+    videos = {}
+
+    def video(vid):
+        return videos.setdefault(vid, {
+            "video_id": vid, "bytes": 0, "raw_bytes": 0,
+            "extraction_bytes": 0, "extraction_raw_bytes": 0, "extraction_hot": False,
+            "outputs": 0, "output_bytes": 0, "output_raw_bytes": 0,
+        })
+
+    for key, size, raw_size, hot in _video_cache.memory():
+        entry = video(key)
+        entry.update(extraction_bytes=size, extraction_raw_bytes=raw_size, extraction_hot=hot)
+        entry["bytes"] += size
+        entry["raw_bytes"] += raw_size
+    for key, size, raw_size, _ in _output_cache.memory():
+        entry = video(key[1])
+        entry["outputs"] += 1
+        entry["output_bytes"] += size
+        entry["output_raw_bytes"] += raw_size
+        entry["bytes"] += size
+        entry["raw_bytes"] += raw_size
+    return sorted(videos.values(), key=lambda entry: entry["bytes"], reverse=True)
+
+
+def get_chat_history_stats():
+    """Get chat history summary cache counters."""
+    return _history_manager.stats()
+
+
+def get_extraction_stats():
+    """Get single-flight counters: real extractions, coalesced waiters and in-flight calls."""
+    return _extraction_flight.stats()
+
+
+def _collect_metrics():
+    """Export the cache, single-flight and chat history counters on /metrics."""
+    cache = _video_cache.stats()
+    extraction = _extraction_flight.stats()
+    output = _output_cache.stats()
+    history = _history_manager.stats()
+    answers = get_answer_cache_stats()
+    with _summary_tree_counts_lock:
+        tree = dict(_summary_tree_counts)
+    Sample = metrics.Sample
+    return [
+        Sample("smarted_video_cache_hits_total", "counter", "Video cache lookups that hit.", cache["hits"]),
+        Sample("smarted_video_cache_misses_total", "counter", "Video cache lookups that missed.", cache["misses"]),
+        Sample("smarted_video_cache_evictions_total", "counter", "Entries evicted for size.", cache["evictions"]),
+        Sample("smarted_video_cache_expirations_total", "counter", "Entries expired by TTL.", cache["expirations"]),
+        Sample("smarted_video_cache_rejected_total", "counter", "Values too large to cache.", cache["rejected"]),
+        Sample("smarted_video_cache_entries", "gauge", "Entries in the video cache.", cache["entries"]),
+        Sample("smarted_video_cache_bytes", "gauge", "Approximate bytes held by the video cache.", cache["bytes"]),
+        Sample("smarted_video_cache_raw_bytes", "gauge", "Bytes the video cache would hold uncompressed.", cache["raw_bytes"]),
+        Sample("smarted_output_cache_hits_total", "counter", "Summary/quiz output cache lookups that hit.", output["hits"]),
+        Sample("smarted_output_cache_misses_total", "counter", "Summary/quiz output cache lookups that missed.", output["misses"]),
+        Sample("smarted_output_cache_evictions_total", "counter", "Outputs evicted for size.", output["evictions"]),
+        Sample("smarted_output_cache_entries", "gauge", "Entries in the output cache.", output["entries"]),
+        Sample("smarted_output_cache_bytes", "gauge", "Approximate bytes held by the output cache.", output["bytes"]),
+        Sample("smarted_output_cache_raw_bytes", "gauge", "Bytes the output cache would hold uncompressed.", output["raw_bytes"]),
+        Sample("smarted_quiz_banks", "gauge", "Quiz question banks held in memory.", len(_quiz_banks)),
+        Sample("smarted_summary_tree_assembled_total", "counter", "Summaries assembled from a cached summary tree.", tree["assembled"]),
+        Sample("smarted_summary_tree_fallbacks_total", "counter", "Summary lengths a summary tree couldn't serve.", tree["fallbacks"]),
+        Sample("smarted_answer_cache_hits_total", "counter", "Chat questions answered from the semantic answer cache.", answers["hits"]),
+        Sample("smarted_answer_cache_misses_total", "counter", "History-free chat questions with no close cached answer.", answers["misses"]),
+        Sample("smarted_answer_cache_stores_total", "counter", "Chat answers added to the semantic answer cache.", answers["stores"]),
+        Sample("smarted_answer_cache_entries", "gauge", "Chat answers held in the semantic answer cache.", answers["entries"]),
+        Sample("smarted_answer_cache_bytes", "gauge", "Approximate bytes held by the semantic answer cache.", answers["bytes"]),
+        Sample("smarted_extractions_total", "counter", "Extractions actually run (single-flight leaders).", extraction["leaders"]),
+        Sample("smarted_extractions_coalesced_total", "counter", "Callers that waited on another caller's extraction.", extraction["coalesced"]),
+        Sample("smarted_extractions_in_flight", "gauge", "Extractions currently running.", extraction["in_flight"]),
+        Sample("smarted_chat_history_summaries_built_total", "counter", "Chat history summaries generated.", history["summaries_built"]),
+        Sample("smarted_chat_history_summary_hits_total", "counter", "Chat history summaries served from cache.", history["summary_hits"]),
+    ] + [
+        sample
+        for name, stats in (("video", cache), ("output", output)) if stats["hot"] is not None
+        for sample in (
+            Sample("smarted_cache_hot_entries", "gauge", "Compressed entries held decompressed.", stats["hot"]["entries"], {"cache": name}),
+            Sample("smarted_cache_hot_bytes", "gauge", "Bytes of decompressed hot entries.", stats["hot"]["bytes"], {"cache": name}),
+            Sample("smarted_cache_hot_hits_total", "counter", "Reads served from the hot set.", stats["hot"]["hits"], {"cache": name}),
+            Sample("smarted_cache_decompressions_total", "counter", "Reads that decompressed an entry.", stats["hot"]["decompressions"], {"cache": name}),
+        )
+    ]
+
+metrics.REGISTRY.add_collector(_collect_metrics)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,136 @@
+"""
+Per-video quiz question bank.
+
+One generation pass produces a batch of questions for a video; /quiz then
+serves slices of the bank that skip what the user has already seen. "Seen" is
+judged by local text similarity (Jaccard over word unigrams and bigrams), so
+reworded repeats of a previous question are filtered out as well as exact
+ones. Near-duplicates are also dropped when new batches are merged in.
+"""
+import json
+import re
+import threading
+
+from retrieval import tokenize
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+
+
+def shingles(text):
+    """Word unigrams and bigrams of text (stopwords removed)."""
+    tokens = tokenize(text)
+    return frozenset(tokens) | frozenset(zip(tokens, tokens[1:]))
+
+
+def similarity(a, b):
+    """Jaccard similarity of two shingle sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def parse_questions(text):
+    """
+    Extract well-formed questions from a quiz generation.
+
+    Accepts the JSON format requested by the quiz prompt, optionally wrapped in
+    a markdown code fence. Malformed entries are skipped.
+
+    Returns:
+        list: [{"question", "options": {"A".."D"}, "correct_answer", "explanation"}, ...]
+    """
+    text = _FENCE_RE.sub("", text.strip())
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return []
+    try:
+        data = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return []
+
+    questions = []
+    for item in data.get("questions", []) if isinstance(data, dict) else []:
+        if not isinstance(item, dict):
+            continue
+        question = item.get("question")
+        options = item.get("options")
+        answer = item.get("correct_answer")
+        if not isinstance(question, str) or not question.strip():
+            continue
+        if not isinstance(options, dict) or set(options) != set("ABCD") or answer not in options:
+            continue
+        questions.append({
+            "question": question.strip(),
+            "options": {letter: str(options[letter]) for letter in "ABCD"},
+            "correct_answer": answer,
+            "explanation": str(item.get("explanation", "")),
+        })
+    return questions
+
+
+class QuestionBank:
+    """
+    Thread-safe list of distinct questions for one video.
+
+    Args:
+        questions (list): Initial questions (near-duplicates are dropped)
+        threshold (float): Similarity at or above which two questions count as the same
+        max_size (int): Questions kept at most; further additions are ignored
+    """
+
+    def __init__(self, questions=(), threshold=0.6, max_size=120):
+        self.threshold = threshold
+        self.max_size = max_size
+        self._questions = []
+        self._shingles = []
+        self._lock = threading.Lock()
+        self.add(questions)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._questions)
+
+    def is_full(self):
+        return len(self) >= self.max_size
+
+    def questions(self):
+        with self._lock:
+            return list(self._questions)
+
+    def _is_duplicate(self, candidate, seen):
+        return any(similarity(candidate, other) >= self.threshold for other in seen)
+
+    def add(self, questions):
+        """Append questions that aren't near-duplicates of the bank; returns how many were added."""
+        added = 0
+        with self._lock:
+            for question in questions:
+                if len(self._questions) >= self.max_size:
+                    break
+                candidate = shingles(question["question"])
+                if self._is_duplicate(candidate, self._shingles):
+                    continue
+                self._questions.append(question)
+                self._shingles.append(candidate)
+                added += 1
+        return added
+
+    def _unseen(self, previous_questions):
+        seen_texts = {q.strip() for q in previous_questions or () if isinstance(q, str)}
+        seen = [shingles(text) for text in seen_texts]
+        with self._lock:
+            items = list(zip(self._questions, self._shingles))
+        return [
+            question for question, candidate in items
+            if question["question"] not in seen_texts and not self._is_duplicate(candidate, seen)
+        ]
+
+    def select(self, count, previous_questions=None):
+        """
+        Next `count` questions, in bank order, that the user hasn't seen.
+
+        Returns:
+            tuple: (questions, number of unseen questions left after these)
+        """
+        unseen = self._unseen(previous_questions)
+        return unseen[:count], max(0, len(unseen) - count)
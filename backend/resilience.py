@@ -0,0 +1,302 @@
+"""
+Retries, deadlines and hedging for model calls.
+
+Rate limits (429) and server errors (5xx) from Gemini or an OpenAI-compatible
+endpoint are usually transient, so every model call goes through a
+RetryPolicy:
+
+- retryable errors are retried with exponential backoff and full jitter,
+  or after the delay the server asked for (Retry-After header, Gemini
+  RetryInfo.retryDelay) when it gives one
+- all attempts of one call share a deadline; async attempts are cancelled
+  when it passes, blocking ones can only stop being retried
+- optionally, an async call that is slower than a latency percentile of its
+  stage gets a second, hedged request; the first to succeed wins and the
+  other is cancelled
+- a stream is retried only until its first chunk has been yielded
+"""
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+
+import metrics
+
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class DeadlineExceeded(TimeoutError):
+    """A model call (including its retries) ran past its deadline."""
+
+
+def status_code(exc):
+    """HTTP status carried by a backend/SDK exception, or None."""
+    for attr in ("status_code", "code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_retryable(exc):
+    """Rate limits, server errors, timeouts and dropped connections are worth retrying."""
+    if isinstance(exc, DeadlineExceeded):
+        return False
+    status = status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    # SDK transport errors (httpx.ConnectTimeout, openai.APIConnectionError, ...)
+    name = type(exc).__name__
+    return "Timeout" in name or "Connection" in name
+
+
+def _parse_seconds(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    try:
+        return float(text[:-1] if text.endswith("s") else text)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(text).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _find_retry_delay(details):
+    if isinstance(details, dict):
+        if "retryDelay" in details:
+            return details["retryDelay"]
+        values = details.values()
+    elif isinstance(details, (list, tuple)):
+        values = details
+    else:
+        return None
+    for value in values:
+        found = _find_retry_delay(value)
+        if found is not None:
+            return found
+    return None
+
+
+def retry_after(exc):
+    """Seconds the server asked us to wait before retrying, or None."""
+    hint = _parse_seconds(getattr(exc, "retry_after", None))
+    if hint is not None:
+        return hint
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if headers is not None:
+        try:
+            hint = _parse_seconds(headers.get("retry-after"))
+        except AttributeError:
+            hint = None
+        if hint is not None:
+            return hint
+    # google-genai APIError keeps the error body, including RetryInfo, in .details
+    return _parse_seconds(_find_retry_delay(getattr(exc, "details", None)))
+
+
+def _reason(exc):
+    status = status_code(exc)
+    return str(status) if status is not None else "network"
+
+
+class LatencyTracker:
+    """Recent successful call durations per stage, for the hedging threshold."""
+
+    def __init__(self, window=200):
+        self._window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self._window)
+            samples.append(seconds)
+
+    def percentile(self, stage, pct, min_samples=1):
+        """The pct-th percentile of stage's recent durations, or None with too few samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(stage, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+class RetryPolicy:
+    """
+    Runs model call attempts with retries, a deadline and optional hedging.
+
+    Args:
+        attempts (int): Attempts per call, including the first
+        base_delay (float): Backoff cap for the first retry; doubles each retry
+        max_delay (float): Largest backoff cap (server hints may exceed it)
+        deadline (float): Seconds all attempts of one call may take (None = no limit)
+        hedge_percentile (float): Hedge async calls slower than this percentile
+            of their stage (0 = never hedge)
+        hedge_min_samples (int): Successful calls a stage needs before it is hedged
+        hedge_stages (iterable): Stages that may be hedged (None = all)
+    """
+
+    def __init__(self, attempts=3, base_delay=1.0, max_delay=20.0, deadline=None,
+                 hedge_percentile=0, hedge_min_samples=20, hedge_stages=None):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_stages = frozenset(hedge_stages) if hedge_stages is not None else None
+        self.latency = LatencyTracker()
+        self._rng = random.Random()
+
+    def _backoff(self, retry, exc):
+        hint = retry_after(exc)
+        if hint is not None:
+            return hint
+        cap = min(self.max_delay, self.base_delay * 2 ** retry)
+        return self._rng.uniform(0, cap)
+
+    def _deadline(self):
+        return time.monotonic() + self.deadline if self.deadline else None
+
+    def _next_delay(self, stage, retry, exc, deadline):
+        """Seconds to wait before the next attempt, or None to give up and re-raise exc."""
+        if retry + 1 >= self.attempts or not is_retryable(exc):
+            return None
+        delay = self._backoff(retry, exc)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return None
+        metrics.LLM_RETRIES.inc(stage=stage, reason=_reason(exc))
+        return delay
+
+    def call(self, stage, attempt):
+        """
+        Run attempt() (blocking) until it succeeds or retrying stops.
+
+        A blocking attempt can't be interrupted, so the deadline only stops
+        further retries.
+        """
+        deadline = self._deadline()
+        for retry in range(self.attempts):
+            started = time.monotonic()
+            try:
+                result = attempt()
+            except Exception as e:
+                delay = self._next_delay(stage, retry, e, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self.latency.record(stage, time.monotonic() - started)
+            return result
+
+    def _hedge_delay(self, stage):
+        if not self.hedge_percentile:
+            return None
+        if self.hedge_stages is not None and stage not in self.hedge_stages:
+            return None
+        return self.latency.percentile(stage, self.hedge_percentile, self.hedge_min_samples)
+
+    async def _hedged(self, stage, attempt, hedge):
+        """Run attempt(), adding a second copy if the first outlives the stage's hedge delay."""
+        delay = self._hedge_delay(stage) if hedge else None
+        if delay is None:
+            return await attempt()
+
+        tasks = {asyncio.ensure_future(attempt())}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                metrics.LLM_HEDGES.inc(stage=stage)
+                tasks.add(asyncio.ensure_future(attempt()))
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def acall(self, stage, attempt, hedge=True):
+        """
+        Await attempt() (a coroutine factory) until it succeeds or retrying
+        stops; attempts still running at the deadline are cancelled. hedge=False
+        opts this call out of hedging (e.g. costly video analysis).
+
+        Raises:
+            DeadlineExceeded: If the deadline passed during an attempt
+        """
+        deadline = self._deadline()
+        for retry in range(self.attempts):
+            started = time.monotonic()
+            try:
+                async with asyncio.timeout_at(_loop_time(deadline)) as timeout:
+                    result = await self._hedged(stage, attempt, hedge)
+            except Exception as e:
+                if timeout.expired():
+                    raise DeadlineExceeded(f"Model call ({stage}) exceeded its {self.deadline:g}s deadline") from e
+                delay = self._next_delay(stage, retry, e, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self.latency.record(stage, time.monotonic() - started)
+            return result
+
+    async def astream(self, stage, open_stream):
+        """
+        Yield from open_stream() (an async generator factory), retrying with a
+        fresh stream while nothing has been yielded yet. The deadline bounds
+        the wait for the first chunk only.
+        """
+        deadline = self._deadline()
+        for retry in range(self.attempts):
+            stream = open_stream()
+            try:
+                async with asyncio.timeout_at(_loop_time(deadline)) as timeout:
+                    first = await anext(stream)
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                await stream.aclose()
+                if timeout.expired():
+                    raise DeadlineExceeded(f"Model stream ({stage}) produced nothing within {self.deadline:g}s") from e
+                delay = self._next_delay(stage, retry, e, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                await stream.aclose()
+                raise
+
+            try:
+                yield first
+                async for item in stream:
+                    yield item
+            finally:
+                await stream.aclose()
+            return
+
+
+def _loop_time(deadline):
+    """Convert a time.monotonic() deadline to the running loop's clock (None stays None)."""
+    if deadline is None:
+        return None
+    loop = asyncio.get_running_loop()
+    return loop.time() + (deadline - time.monotonic())
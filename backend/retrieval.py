@@ -0,0 +1,165 @@
+"""
+Local retrieval over an extracted video analysis.
+
+The analysis is split into sections once per video and indexed with BM25.
+Chat questions then send only the most relevant sections to the model instead
+of the whole analysis. Scoring is NumPy-vectorized over per-term postings; no
+external service is involved.
+"""
+import re
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_HEADING_RE = re.compile(r"^\s*(#{1,6}\s|\*\*[^*]+\*\*\s*:?\s*$|\d+\.\s+\*\*)")
+
+_STOPWORDS = frozenset("""
+a an and are as at be but by can could did do does for from had has have how i if in
+into is it its me my of on or our so such than that the their them then there these
+they this those to was we were what when where which while who why will with would
+you your about video explain tell please
+""".split())
+
+# Questions that want the whole video rather than a specific part of it
+_BROAD_RE = re.compile(
+    r"\b(summar\w*|overview|main (points?|ideas?|topics?)|key (points?|takeaways?|ideas?)"
+    r"|whole video|entire video|overall|everything|what is (this|the) video about"
+    r"|what does (this|the) video cover|outline)\b",
+    re.IGNORECASE,
+)
+
+
+def tokenize(text):
+    """Lowercase word tokens with stopwords removed."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def estimate_tokens(text):
+    """Rough LLM token count (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def split_sections(text, max_chars=1500):
+    """
+    Split an analysis into sections at markdown headings, then split any
+    section longer than max_chars at paragraph boundaries.
+    """
+    sections = []
+    current = []
+    for line in text.splitlines():
+        if _HEADING_RE.match(line) and any(l.strip() for l in current):
+            sections.append("\n".join(current).strip())
+            current = []
+        current.append(line)
+    if any(l.strip() for l in current):
+        sections.append("\n".join(current).strip())
+
+    chunks = []
+    for section in sections:
+        if len(section) <= max_chars:
+            chunks.append(section)
+            continue
+        piece = ""
+        for paragraph in re.split(r"\n\s*\n", section):
+            if piece and len(piece) + len(paragraph) > max_chars:
+                chunks.append(piece.strip())
+                piece = ""
+            piece += paragraph + "\n\n"
+        if piece.strip():
+            chunks.append(piece.strip())
+    return chunks
+
+
+class SectionIndex:
+    """
+    BM25 index over the sections of one analysis.
+
+    Per-term weights are precomputed at build time, so a query is one
+    scatter-add per query term into a score vector.
+    """
+
+    def __init__(self, text, k1=1.5, b=0.75, max_chars=1500):
+        self.text = text
+        self.sections = split_sections(text, max_chars=max_chars)
+        self.section_tokens = np.array([estimate_tokens(s) for s in self.sections], dtype=np.int32)
+
+        docs = [tokenize(s) for s in self.sections]
+        lengths = np.array([len(d) for d in docs], dtype=np.float32)
+        avg_length = float(lengths.mean()) if len(docs) and lengths.mean() > 0 else 1.0
+        norm = k1 * (1 - b + b * lengths / avg_length)
+
+        postings = {}
+        for doc_id, doc in enumerate(docs):
+            counts = {}
+            for term in doc:
+                counts[term] = counts.get(term, 0) + 1
+            for term, tf in counts.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(doc_id)
+                postings[term][1].append(tf)
+
+        n_docs = len(docs)
+        self._postings = {}
+        for term, (doc_ids, tfs) in postings.items():
+            doc_ids = np.array(doc_ids, dtype=np.int32)
+            tfs = np.array(tfs, dtype=np.float32)
+            idf = np.log(1 + (n_docs - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            weights = idf * tfs * (k1 + 1) / (tfs + norm[doc_ids])
+            self._postings[term] = (doc_ids, weights.astype(np.float32))
+
+    def __len__(self):
+        return len(self.sections)
+
+    def scores(self, query):
+        """BM25 score of every section for query."""
+        scores = np.zeros(len(self.sections), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        return scores
+
+    def search(self, query, top_k):
+        """Indices of the top_k sections with a positive score, best first."""
+        scores = self.scores(query)
+        if not scores.any():
+            return []
+        top_k = min(top_k, len(scores))
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [int(i) for i in candidates if scores[i] > 0]
+
+
+def is_broad_question(question):
+    """Whether a question is about the video as a whole (summary, main points...)."""
+    return bool(_BROAD_RE.search(question))
+
+
+def select_context(index, question, top_k, token_budget):
+    """
+    Pick the analysis text to send with a chat question.
+
+    Returns the full analysis when it already fits the budget, when the
+    question is broad, or when nothing in the index matches; otherwise the
+    top_k matching sections that fit within token_budget, in document order.
+
+    Returns:
+        tuple: (context text, whether it is the full analysis)
+    """
+    if estimate_tokens(index.text) <= token_budget or is_broad_question(question):
+        return index.text, True
+
+    ranked = index.search(question, top_k)
+    if not ranked:
+        return index.text, True
+
+    chosen = []
+    used = 0
+    for i in ranked:
+        cost = int(index.section_tokens[i])
+        if chosen and used + cost > token_budget:
+            continue
+        chosen.append(i)
+        used += cost
+
+    return "\n\n[...]\n\n".join(index.sections[i] for i in sorted(chosen)), False
@@ -0,0 +1,92 @@
+"""
+Segmented extraction helpers for long videos.
+
+A multi-hour lecture is analyzed as consecutive time segments (via Gemini's
+video offset metadata) that run concurrently, then merged back in order. The
+video length comes from a pluggable duration probe; the default one reads it
+from the YouTube watch page.
+"""
+import re
+import threading
+
+_LENGTH_RE = re.compile(r'"lengthSeconds"\s*:\s*"(\d+)"')
+
+FAILED_SEGMENT_NOTE = "_This part of the video could not be analyzed._"
+
+
+class YouTubeDurationProbe:
+    """Read a video's length in seconds from its watch page."""
+
+    def __init__(self, timeout=10):
+        self.timeout = timeout
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        # requests is imported on first use, not when the worker starts
+        with self._lock:
+            if self._session is None:
+                import requests
+
+                self._session = requests.Session()
+            return self._session
+
+    def warm(self):
+        """Open the HTTP session ahead of the first probe."""
+        self._get_session()
+
+    def duration(self, video_id):
+        """Return the length in seconds, or None if it can't be determined."""
+        response = self._get_session().get(
+            "https://www.youtube.com/watch",
+            params={"v": video_id},
+            headers={"Accept-Language": "en-US"},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        match = _LENGTH_RE.search(response.text)
+        return int(match.group(1)) if match else None
+
+
+class StaticDurationProbe:
+    """Serve durations from a dict of video ID -> seconds (local stub)."""
+
+    def __init__(self, durations):
+        self.durations = durations
+
+    def duration(self, video_id):
+        return self.durations.get(video_id)
+
+
+def plan_segments(duration, segment_seconds):
+    """
+    Split [0, duration) into consecutive (start, end) second offsets.
+
+    A short tail (under a third of a segment) is merged into the previous
+    segment rather than analyzed on its own.
+    """
+    bounds = []
+    start = 0
+    while start < duration:
+        end = min(duration, start + segment_seconds)
+        if bounds and end - start < segment_seconds / 3:
+            bounds[-1] = (bounds[-1][0], end)
+        else:
+            bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def _clock(seconds):
+    hours, rest = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+def merge_segments(bounds, analyses):
+    """Join per-segment analyses in order under a heading per time range (None = failed)."""
+    parts = []
+    for i, ((start, end), analysis) in enumerate(zip(bounds, analyses), start=1):
+        body = analysis.strip() if analysis is not None else FAILED_SEGMENT_NOTE
+        parts.append(f"# Part {i} ({_clock(start)} - {_clock(end)})\n\n{body}")
+    return "\n\n".join(parts)
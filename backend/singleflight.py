@@ -0,0 +1,111 @@
+"""
+Single-flight call coalescing.
+
+When several callers ask for the same key at the same time, only the first one
+(the "leader") runs the underlying work; everyone else waits for that result.
+The in-flight table is shared between worker threads (sync endpoints running in
+the threadpool) and the event loop (async endpoints), so a sync and an async
+caller for the same video still share one extraction.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class _LeaderCancelled(Exception):
+    """Set on a shared call whose leader was cancelled before finishing."""
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into a single execution."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _join(self, key):
+        """Return (future, is_leader) for key, registering a new call if needed."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            # Mark it running so a waiter's cancellation (asyncio.wrap_future
+            # cancels the future it wraps) can't cancel the shared call
+            future.set_running_or_notify_cancel()
+            self._calls[key] = future
+            self.leaders += 1
+            return future, True
+
+    def _finish(self, key, future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def do(self, key, fn):
+        """
+        Run fn() once for all concurrent callers of key (blocking).
+
+        Must not be called from the event loop thread: waiting on an in-flight
+        async leader would block the loop that is supposed to finish it.
+        """
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                return future.result()
+            except _LeaderCancelled:
+                continue
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._finish(key, future)
+
+    async def do_async(self, key, fn):
+        """Await fn() once for all concurrent callers of key; fn returns a coroutine."""
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                return await asyncio.wrap_future(future)
+            except _LeaderCancelled:
+                # The leader's request went away; one of the waiters takes over.
+                continue
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._finish(key, future)
+
+    def in_flight(self):
+        """Number of keys currently being computed."""
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        """Counters for leaders (real executions) and coalesced waiters."""
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
@@ -0,0 +1,204 @@
+"""
+Persistent on-disk store for extracted video content.
+
+A single SQLite file shared by every uvicorn worker on the host. Values are
+zlib-compressed and keyed by video ID. A small lease table provides
+cross-process locking so only one worker runs the extraction for a given video
+while the others wait for its row to appear. Quiz question banks are stored
+next to the extraction they were generated from.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS extractions (
+    video_id   TEXT PRIMARY KEY,
+    content    BLOB NOT NULL,
+    meta       TEXT NOT NULL DEFAULT '{}',
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS extractions_created_at ON extractions (created_at);
+CREATE TABLE IF NOT EXISTS quiz_banks (
+    video_id     TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    questions    BLOB NOT NULL,
+    updated_at   REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    video_id   TEXT PRIMARY KEY,
+    owner      TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class ExtractionStore:
+    """
+    SQLite-backed extraction store with compressed values and per-video leases.
+
+    Args:
+        path (str): Database file; created on first use
+        lease_seconds (float): How long an extraction lease lasts without a
+            renew before other workers may assume the holder died
+        compress_level (int): zlib compression level for stored content
+    """
+
+    def __init__(self, path, lease_seconds=300, compress_level=6):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.compress_level = compress_level
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self):
+        """Return this thread's connection (sqlite3 connections are not shareable)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _pack(self, content):
+        return zlib.compress(content.encode("utf-8"), self.compress_level)
+
+    @staticmethod
+    def _unpack(blob):
+        return zlib.decompress(blob).decode("utf-8")
+
+    def get(self, video_id):
+        """Return (content, meta) for video_id, or None if not stored."""
+        row = self._connect().execute(
+            "SELECT content, meta FROM extractions WHERE video_id = ?", (video_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return self._unpack(row[0]), json.loads(row[1])
+
+    def put(self, video_id, content, **meta):
+        """Store content for video_id, replacing any previous value."""
+        self._connect().execute(
+            "INSERT OR REPLACE INTO extractions (video_id, content, meta, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            (video_id, self._pack(content), json.dumps(meta), time.time()),
+        )
+
+    def delete(self, video_id):
+        conn = self._connect()
+        conn.execute("DELETE FROM extractions WHERE video_id = ?", (video_id,))
+        conn.execute("DELETE FROM quiz_banks WHERE video_id = ?", (video_id,))
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute("DELETE FROM extractions")
+        conn.execute("DELETE FROM quiz_banks")
+        conn.execute("DELETE FROM leases")
+
+    def get_quiz_bank(self, video_id, content_hash):
+        """Return the stored questions for video_id, or None if missing or built from other content."""
+        row = self._connect().execute(
+            "SELECT questions FROM quiz_banks WHERE video_id = ? AND content_hash = ?",
+            (video_id, content_hash),
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(self._unpack(row[0]))
+
+    def put_quiz_bank(self, video_id, content_hash, questions):
+        """Store the question bank generated from the extraction with content_hash."""
+        self._connect().execute(
+            "INSERT OR REPLACE INTO quiz_banks (video_id, content_hash, questions, updated_at) "
+            "VALUES (?, ?, ?, ?)",
+            (video_id, content_hash, self._pack(json.dumps(questions)), time.time()),
+        )
+
+    def recent(self, limit):
+        """Yield (video_id, content, meta) for the most recently stored videos."""
+        rows = self._connect().execute(
+            "SELECT video_id, content, meta FROM extractions ORDER BY created_at DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        for video_id, blob, meta in rows:
+            yield video_id, self._unpack(blob), json.loads(meta)
+
+    def acquire(self, video_id):
+        """
+        Try to take the extraction lease for video_id.
+
+        Returns:
+            bool: True if this process now holds the lease
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT owner, expires_at FROM leases WHERE video_id = ?", (video_id,)
+            ).fetchone()
+            if row is not None and row[0] != self.owner and row[1] > now:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (video_id, owner, expires_at) VALUES (?, ?, ?)",
+                (video_id, self.owner, now + self.lease_seconds),
+            )
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            # A failed COMMIT may already have ended the transaction
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def renew(self, video_id):
+        """
+        Extend our lease on video_id by another lease_seconds.
+
+        Returns:
+            bool: False if this process no longer holds the lease
+        """
+        cursor = self._connect().execute(
+            "UPDATE leases SET expires_at = ? WHERE video_id = ? AND owner = ?",
+            (time.time() + self.lease_seconds, video_id, self.owner),
+        )
+        return cursor.rowcount > 0
+
+    def release(self, video_id):
+        """Drop our lease on video_id so waiting workers stop polling."""
+        self._connect().execute(
+            "DELETE FROM leases WHERE video_id = ? AND owner = ?", (video_id, self.owner)
+        )
+
+    def is_leased(self, video_id):
+        """Whether another live process currently holds the lease for video_id."""
+        row = self._connect().execute(
+            "SELECT 1 FROM leases WHERE video_id = ? AND owner != ? AND expires_at > ?",
+            (video_id, self.owner, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def wait_for(self, video_id, timeout, poll_interval=0.5):
+        """
+        Wait for another worker's extraction of video_id to land in the store.
+
+        Returns:
+            tuple | None: (content, meta) once stored, or None if the lease was
+            released or expired without a result, or timeout elapsed
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            stored = self.get(video_id)
+            if stored is not None:
+                return stored
+            if not self.is_leased(video_id) or time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval)
@@ -0,0 +1,134 @@
+"""
+Hierarchical video summaries.
+
+One generation pass produces a summary tree for a video: a title, a short
+introduction, a few takeaways covering the whole video, and per section a
+one-sentence summary plus key points ordered most important first. A markdown
+summary of any target length inside the tree's range is then assembled
+locally: the top level always, the section summaries when they fit, then key
+points round-robin by rank (every section's first point before any second
+point) until the next one would overshoot the target.
+"""
+import json
+import re
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+_WORD_RE = re.compile(r"\w[\w'’-]*")
+
+
+def word_count(text):
+    """Words in text, ignoring markdown punctuation."""
+    return len(_WORD_RE.findall(text))
+
+
+def _text(value):
+    return value.strip() if isinstance(value, str) else ""
+
+
+def _texts(values):
+    if not isinstance(values, list):
+        return []
+    return [text for text in map(_text, values) if text]
+
+
+class SummaryTree:
+    """
+    Parsed summary tree.
+
+    Args:
+        title (str): Video title
+        introduction (str): Two or three sentences of context
+        takeaways (list): Top-level bullets covering the whole video
+        sections (list): [(heading, summary, [point, ...]), ...] in video order,
+            points most important first
+    """
+
+    def __init__(self, title, introduction, takeaways, sections):
+        self.title = title
+        self.introduction = introduction
+        self.takeaways = takeaways
+        self.sections = sections
+
+    def _render(self, with_sections, ranks):
+        lines = [f"# {self.title}"]
+        if self.introduction:
+            lines += ["", self.introduction]
+        if with_sections:
+            for (heading, summary, points), shown in zip(self.sections, ranks):
+                lines += ["", f"## {heading}", "", summary]
+                if shown:
+                    lines.append("")
+                    lines += [f"- {point}" for point in points[:shown]]
+        lines += ["", "## Key Takeaways", ""]
+        lines += [f"- {takeaway}" for takeaway in self.takeaways]
+        return "\n".join(lines)
+
+    def min_words(self):
+        """Length of the shortest summary the tree can produce."""
+        return word_count(self._render(False, ()))
+
+    def render(self, max_length, min_fill=0.6):
+        """
+        Markdown summary of at most max_length words.
+
+        Args:
+            max_length (int): Target length in words
+            min_fill (float): Fraction of max_length the summary must reach
+
+        Returns:
+            str: The summary, or None if the tree can't produce one between
+            min_fill * max_length and max_length words
+        """
+        words = self.min_words()
+        if words > max_length:
+            return None
+        ranks = [0] * len(self.sections)
+        with_sections = False
+        section_words = sum(word_count(f"{heading} {summary}") for heading, summary, _ in self.sections)
+        if self.sections and words + section_words <= max_length:
+            with_sections = True
+            words += section_words
+            order = sorted((rank, i) for i, (_, _, points) in enumerate(self.sections) for rank in range(len(points)))
+            for rank, i in order:
+                size = word_count(self.sections[i][2][rank])
+                if words + size > max_length:
+                    break
+                words += size
+                ranks[i] = rank + 1
+        if words < min_fill * max_length:
+            return None
+        return self._render(with_sections, ranks)
+
+
+def parse_summary_tree(text):
+    """
+    Parse a summary tree generation (JSON, optionally in a markdown code fence).
+
+    Returns:
+        SummaryTree: The tree, or None if text has no title or no takeaways
+    """
+    text = _FENCE_RE.sub("", text.strip())
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    title = _text(data.get("title"))
+    takeaways = _texts(data.get("takeaways"))
+    if not title or not takeaways:
+        return None
+    sections = []
+    items = data.get("sections")
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        heading = _text(item.get("heading"))
+        summary = _text(item.get("summary"))
+        if heading and summary:
+            sections.append((heading, summary, _texts(item.get("points"))))
+    return SummaryTree(title, _text(data.get("introduction")), takeaways, sections)
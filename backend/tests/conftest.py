@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Modules import each other flat (from model import ...), as when run from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# No Gemini client or shared on-disk store when model.py is imported by a test
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("EXTRACTION_STORE_PATH", "")
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from admission import AdmissionController, ClassLimits, Overloaded, BACKGROUND, STANDARD
+
+
+def _controller(limit=1, max_queue=1, max_wait=None, per_key_limit=None):
+    return AdmissionController(
+        limit,
+        {STANDARD: ClassLimits(1, limit, max_queue, max_wait), BACKGROUND: ClassLimits(2, limit, max_queue)},
+        per_key_limit=per_key_limit,
+    )
+
+
+def _rejection(controller, name=STANDARD, key=None, **admit):
+    """Hold one slot of name, then return the Overloaded raised for the next request."""
+    async def run():
+        async with controller.admit(name):
+            with pytest.raises(Overloaded) as info:
+                async with controller.admit(name, key, **admit):
+                    pass
+        return info.value
+
+    return asyncio.run(run())
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    error = _rejection(_controller(max_queue=0))
+    assert "waiting" in str(error)
+    assert 1 <= error.retry_after <= 60
+
+
+def test_wait_timeout_is_rejected():
+    error = _rejection(_controller(max_wait=0.01))
+    assert "Timed out" in str(error)
+    assert error.retry_after >= 1
+
+
+def test_per_key_limit_is_rejected():
+    controller = _controller(limit=4, per_key_limit=1)
+
+    async def run():
+        async with controller.admit(STANDARD, "key"):
+            async with controller.admit(STANDARD, "other"):
+                pass
+            with pytest.raises(Overloaded):
+                async with controller.admit(STANDARD, "key"):
+                    pass
+
+    asyncio.run(run())
+    assert controller.stats()["classes"][STANDARD]["rejected"] == 1
+
+
+def test_higher_priority_waiter_gets_the_freed_slot():
+    controller = _controller()
+    order = []
+
+    async def request(name):
+        async with controller.admit(name):
+            order.append(name)
+
+    async def run():
+        async with controller.admit(STANDARD):
+            background = asyncio.create_task(request(BACKGROUND))
+            await asyncio.sleep(0)
+            standard = asyncio.create_task(request(STANDARD))
+            await asyncio.sleep(0)
+        await asyncio.gather(background, standard)
+
+    asyncio.run(run())
+    assert order == [STANDARD, BACKGROUND]
+
+
+def test_overloaded_endpoint_answers_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(main, "_admission", _controller(limit=0, max_queue=0))
+    response = TestClient(main.app).post("/summarize", json={"url": "https://youtu.be/dQw4w9WgXcQ"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
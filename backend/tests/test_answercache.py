@@ -0,0 +1,59 @@
+import pytest
+
+from answercache import VideoAnswers, normalize_question
+
+
+def test_reworded_question_hits():
+    answers = VideoAnswers()
+    answers.add("What are the main points of this video?", "POINTS")
+    assert answers.lookup("what are the main points of this video")[0] == "POINTS"
+    assert answers.lookup("What are the main points of the video?")[0] == "POINTS"
+
+
+def test_unrelated_question_misses():
+    answers = VideoAnswers()
+    answers.add("What are the main points of this video?", "POINTS")
+    assert answers.lookup("Which equation describes the reaction force?") is None
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("What is C++?", "What is C?"),
+    ("What is 2+2?", "What is 2-2?"),
+])
+def test_questions_differing_in_symbols_miss(cached, asked):
+    answers = VideoAnswers()
+    answers.add(cached, "CACHED")
+    assert answers.lookup(asked) is None
+    assert answers.lookup(cached.lower())[0] == "CACHED"
+
+
+@pytest.mark.parametrize("asked", [
+    "How did the Roman Empire fall?",
+    "When did the Roman Empire fall?",
+    "Where did the Roman Empire fall?",
+])
+def test_different_interrogative_misses(asked):
+    answers = VideoAnswers()
+    answers.add("Why did the Roman Empire fall?", "WHY")
+    assert answers.lookup(asked) is None
+    assert answers.lookup("why did the roman empire fall")[0] == "WHY"
+
+
+def test_who_and_when_are_different_questions():
+    answers = VideoAnswers()
+    answers.add("Who discovered penicillin?", "FLEMING")
+    assert answers.lookup("When was penicillin discovered?") is None
+
+
+def test_oldest_answer_is_replaced_beyond_max_entries():
+    answers = VideoAnswers(max_entries=2)
+    answers.add("first question about energy", "1")
+    answers.add("second question about memory", "2")
+    answers.add("third question about markets", "3")
+    assert len(answers) == 2
+    assert answers.lookup("first question about energy") is None
+    assert answers.lookup("third question about markets")[0] == "3"
+
+
+def test_normalize_keeps_inner_symbols():
+    assert normalize_question("  What is   C#? ") == "what is c#"
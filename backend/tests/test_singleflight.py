@@ -0,0 +1,56 @@
+import asyncio
+
+from singleflight import SingleFlight
+
+
+def test_cancelled_waiter_leaves_the_shared_call_running():
+    async def run():
+        flight = SingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await release.wait()
+            return "RESULT"
+
+        leader = asyncio.create_task(flight.do_async("k", work))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do_async("k", work))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        late = asyncio.create_task(flight.do_async("k", work))
+        await asyncio.sleep(0)
+        release.set()
+        assert await leader == "RESULT"
+        assert await late == "RESULT"
+        assert waiter.cancelled()
+        assert calls == [1]
+        assert flight.in_flight() == 0
+
+    asyncio.run(run())
+
+
+def test_waiter_takes_over_when_the_leader_is_cancelled():
+    async def run():
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            if len(calls) == 1:
+                await asyncio.Event().wait()  # the leader never finishes on its own
+            return "RESULT"
+
+        leader = asyncio.create_task(flight.do_async("k", work))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do_async("k", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await waiter == "RESULT"
+        assert leader.cancelled()
+        assert len(calls) == 2
+        assert flight.stats() == {"leaders": 2, "coalesced": 1, "in_flight": 0}
+
+    asyncio.run(run())
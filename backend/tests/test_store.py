@@ -0,0 +1,49 @@
+import time
+
+import pytest
+
+from store import ExtractionStore
+
+
+@pytest.fixture
+def stores(tmp_path):
+    """Two workers sharing one store file, with a short lease."""
+    path = str(tmp_path / "store.sqlite3")
+    first, second = ExtractionStore(path, lease_seconds=0.2), ExtractionStore(path, lease_seconds=0.2)
+    first.owner, second.owner = "worker:1", "worker:2"
+    return first, second
+
+
+def test_lease_excludes_other_workers_until_released(stores):
+    first, second = stores
+    assert first.acquire("vid")
+    assert second.is_leased("vid")
+    assert not second.acquire("vid")
+    first.release("vid")
+    assert second.acquire("vid")
+
+
+def test_expired_lease_can_be_taken_over(stores):
+    first, second = stores
+    assert first.acquire("vid")
+    time.sleep(0.3)
+    assert not second.is_leased("vid")
+    assert second.acquire("vid")
+    assert not first.renew("vid")
+
+
+def test_renewed_lease_outlives_lease_seconds(stores):
+    first, second = stores
+    assert first.acquire("vid")
+    for _ in range(3):
+        time.sleep(0.1)
+        assert first.renew("vid")
+    assert not second.acquire("vid")
+
+
+def test_wait_for_gives_up_when_the_lease_expires(stores):
+    first, second = stores
+    assert first.acquire("vid")
+    started = time.monotonic()
+    assert second.wait_for("vid", timeout=5, poll_interval=0.05) is None
+    assert time.monotonic() - started < 1
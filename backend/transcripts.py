@@ -0,0 +1,106 @@
+"""
+Caption fetching for the transcript-first extraction tier.
+
+Analyzing captions as text is far cheaper and faster than sending the whole
+video to Gemini, so extraction tries captions first. Fetchers are pluggable:
+anything with a ``fetch(video_id)`` method returning a list of
+``{"text", "start", "duration"}`` snippets (or raising TranscriptUnavailable)
+can be installed with ``model.set_transcript_fetcher``.
+"""
+import threading
+
+
+class TranscriptUnavailable(Exception):
+    """No usable captions could be fetched for a video."""
+
+
+class YouTubeTranscriptFetcher:
+    """
+    Fetch captions with youtube-transcript-api.
+
+    Args:
+        languages (tuple): Preferred caption languages, in order; if none are
+            available the first listed transcript (any language) is used
+    """
+
+    def __init__(self, languages=("en",)):
+        self.languages = tuple(languages)
+        self._api = None
+        self._lock = threading.Lock()
+
+    def _get_api(self):
+        # youtube-transcript-api (and requests under it) is imported on first use
+        with self._lock:
+            if self._api is None:
+                from youtube_transcript_api import YouTubeTranscriptApi
+
+                self._api = YouTubeTranscriptApi()
+            return self._api
+
+    def warm(self):
+        """Create the API client ahead of the first fetch."""
+        self._get_api()
+
+    def fetch(self, video_id):
+        api = self._get_api()
+        from youtube_transcript_api import NoTranscriptFound, YouTubeTranscriptApiException
+
+        try:
+            transcripts = api.list(video_id)
+            try:
+                transcript = transcripts.find_transcript(self.languages)
+            except NoTranscriptFound:
+                transcript = next(iter(transcripts), None)
+                if transcript is None:
+                    raise TranscriptUnavailable(f"No captions for {video_id}")
+            return transcript.fetch().to_raw_data()
+        except YouTubeTranscriptApiException as e:
+            raise TranscriptUnavailable(str(e)) from e
+
+
+class StaticTranscriptFetcher:
+    """Serve snippets from a dict of video ID -> snippets (local stub for tests and benchmarks)."""
+
+    def __init__(self, transcripts):
+        self.transcripts = transcripts
+
+    def fetch(self, video_id):
+        try:
+            return self.transcripts[video_id]
+        except KeyError:
+            raise TranscriptUnavailable(f"No captions for {video_id}") from None
+
+
+def is_usable(snippets, min_words, min_words_per_minute):
+    """Whether captions are dense enough to stand in for watching the video."""
+    words = sum(len(s.get("text", "").split()) for s in snippets)
+    if words < min_words:
+        return False
+    if snippets:
+        last = snippets[-1]
+        minutes = (last.get("start", 0) + last.get("duration", 0)) / 60
+        if minutes > 0 and words / minutes < min_words_per_minute:
+            return False
+    return True
+
+
+def format_transcript(snippets, stamp_every=30):
+    """Join snippets into text with a [mm:ss] marker roughly every stamp_every seconds."""
+    lines = []
+    current = []
+    next_stamp = 0.0
+    for snippet in snippets:
+        start = snippet.get("start", 0)
+        if start >= next_stamp:
+            if current:
+                lines.append(" ".join(current))
+                current = []
+            minutes, seconds = divmod(int(start), 60)
+            current.append(f"[{minutes:02d}:{seconds:02d}]")
+            next_stamp = start + stamp_every
+        text = snippet.get("text", "").replace("\n", " ").strip()
+        if text:
+            current.append(text)
+    if current:
+        lines.append(" ".join(current))
+    return "\n".join(lines)
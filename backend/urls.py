@@ -0,0 +1,83 @@
+"""
+YouTube URL parsing and canonicalization.
+
+Every cache (extractions, outputs, section indexes, the shared store) is keyed
+by video ID, so all the ways of writing the same video — youtu.be links,
+watch URLs with timestamps or playlist parameters, mobile/music/nocookie
+hosts, embed/shorts/live paths or a bare ID — must map to one ID. Anything
+that doesn't name a single video is rejected before a model call is made.
+"""
+import re
+from urllib.parse import parse_qs, urlparse
+
+_ID_RE = re.compile(r"[A-Za-z0-9_-]{11}")
+
+_YOUTUBE_HOSTS = frozenset({
+    "youtube.com", "m.youtube.com", "music.youtube.com", "gaming.youtube.com",
+    "youtube-nocookie.com",
+})
+_SHORT_HOSTS = frozenset({"youtu.be"})
+
+# Path prefixes followed by the video ID: /embed/ID, /shorts/ID, ...
+_ID_PATHS = ("embed", "shorts", "live", "v", "e")
+
+
+class InvalidVideoURL(ValueError):
+    """The URL does not identify a single YouTube video."""
+
+    def __init__(self, url):
+        super().__init__("Invalid YouTube URL")
+        self.url = url
+
+
+def _host(netloc):
+    host = netloc.lower().rsplit("@", 1)[-1].split(":", 1)[0]
+    return host[4:] if host.startswith("www.") else host
+
+
+def video_id(url):
+    """
+    Return the 11-character video ID that url refers to.
+
+    Raises:
+        InvalidVideoURL: If url is not a YouTube video URL (or bare video ID)
+    """
+    if not isinstance(url, str):
+        raise InvalidVideoURL(url)
+    text = url.strip()
+    if _ID_RE.fullmatch(text):
+        return text
+
+    parsed = urlparse(text if "://" in text else "https://" + text)
+    host = _host(parsed.netloc)
+    segments = [s for s in parsed.path.split("/") if s]
+
+    candidate = None
+    if host in _SHORT_HOSTS:
+        candidate = segments[0] if segments else None
+    elif host in _YOUTUBE_HOSTS:
+        if segments[:1] == ["watch"]:
+            candidate = (parse_qs(parsed.query).get("v") or [None])[0]
+        elif len(segments) >= 2 and segments[0] in _ID_PATHS:
+            candidate = segments[1]
+
+    if candidate is None or not _ID_RE.fullmatch(candidate):
+        raise InvalidVideoURL(url)
+    return candidate
+
+
+def canonical_url(vid):
+    """The one watch URL used for a video ID everywhere (model input, cache metadata)."""
+    return f"https://www.youtube.com/watch?v={vid}"
+
+
+def canonicalize(url):
+    """
+    Returns:
+        tuple: (video ID, canonical watch URL)
+
+    Raises:
+        InvalidVideoURL: If url is not a YouTube video URL
+    """
+    vid = video_id(url)
+    return vid, canonical_url(vid)